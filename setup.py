@@ -16,6 +16,7 @@ setup(
     entry_points={
         'console_scripts': [
             'vidify=vidify.ui.app:run_app',
+            'vidify-batch=vidify.cli.batch:main',
         ],
     },
     python_requires=">=3.7",
@@ -0,0 +1,3 @@
+"""
+Консольные утилиты приложения.
+""" 
\ No newline at end of file
@@ -0,0 +1,408 @@
+"""
+Пакетная обработка видео без графического интерфейса.
+
+Читает манифест заданий (JSON или CSV) и выполняет для каждого задания цепочку
+скачивание -> уникализация -> конвертация в несколько параллельных потоков.
+
+Пример JSON-манифеста::
+
+    {
+        "output_dir": "out",
+        "workers": 4,
+        "defaults": {"effects": {"flip": true}, "convert": "mp4"},
+        "jobs": [
+            {"url": "https://youtu.be/..."},
+            {"input": "clip.mp4", "effects": {"frame": true, "crop_top": 80}},
+            {"input": "clip.mp4", "variants": [{"flip": true}, {"brightness": 30}]},
+            {"input": "clip.mp4", "variants": {"count": 100, "seed": 42,
+                                               "ranges": {"crop_top": [40, 160], "brightness": [0, 30]}}}
+        ]
+    }
+
+Задание с variants создает несколько вариантов одного видео за один запуск
+ffmpeg (параметры каждого варианта дополняют effects). Вместо списка можно
+указать count, seed и ranges: параметры вариантов выбираются случайно, но
+воспроизводимо, и сохраняются рядом с результатами в <имя>_variants.json.
+Обрезка и параметры фона действуют только с рамкой, поэтому при их выборе
+рамка включается автоматически (если frame не указан в ranges).
+
+В CSV каждая строка — задание; колонки url, input, name, convert, copy_audio,
+reencode и параметры эффектов из vidify.core.effects.DEFAULT_EFFECTS.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from vidify.core.downloader import download_url, log_error
+from vidify.core.effects import (
+    DEFAULT_EFFECTS, build_effects_command, build_effects_filter, missing_inputs, normalize_effects
+)
+from vidify.core.intermediates import IntermediateCache, layer_keys
+from vidify.core.probe import probe
+from vidify.core.segment_encoder import encode_segmented, should_encode_segmented
+from vidify.core.variants import DEFAULT_RANGES, encode_variants, sample_variant, sample_variants
+from vidify.core.video_processor import VIDEO_FORMATS, check_ffmpeg_available, create_convert_command, run_ffmpeg
+
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+_TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on', 'да'}
+
+_print_lock = threading.Lock()
+
+
+@dataclass
+class BatchJob:
+    """Задание пакетной обработки."""
+    index: int
+    url: Optional[str] = None
+    input: Optional[str] = None
+    name: Optional[str] = None
+    effects: Optional[Dict[str, Any]] = None
+    variants: Optional[List[Dict[str, Any]]] = None
+    sampling: Optional[Dict[str, Any]] = None
+    convert: Optional[str] = None
+    copy_audio: bool = True
+    reencode: bool = False
+    outputs: List[str] = field(default_factory=list)
+
+    @property
+    def title(self) -> str:
+        return self.url or self.input or f"#{self.index}"
+
+
+def _log(message: str) -> None:
+    """Потокобезопасный вывод в консоль."""
+    with _print_lock:
+        print(message, flush=True)
+
+
+def _parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in _TRUE_VALUES
+
+
+def _coerce_effect(key: str, value: Any) -> Any:
+    """Приводит значение из манифеста к типу параметра по умолчанию."""
+    if key not in DEFAULT_EFFECTS:
+        raise ValueError(f"Неизвестный параметр эффектов: {key}")
+    default = DEFAULT_EFFECTS[key]
+    if isinstance(default, bool):
+        return _parse_bool(value)
+    if isinstance(default, int):
+        return int(value)
+    return str(value)
+
+
+def _make_effects(settings: Dict[str, Any], base_dir: Path) -> Dict[str, Any]:
+    """Приводит параметры эффектов из манифеста к нужным типам и абсолютным путям."""
+    effects = normalize_effects({key: _coerce_effect(key, value) for key, value in settings.items()})
+    for key in ('background_video', 'watermark_video'):
+        if effects[key] and not os.path.isabs(effects[key]):
+            effects[key] = str(base_dir / effects[key])
+    # Построитель фильтров не проверяет файлы, поэтому отсутствующие видео сообщаем сразу
+    missing = missing_inputs(effects)
+    if missing:
+        raise ValueError(f"Файл не найден: {', '.join(missing)}")
+    return effects
+
+
+def _make_job(index: int, raw: Dict[str, Any], defaults: Dict[str, Any], base_dir: Path) -> BatchJob:
+    """Создает задание из записи манифеста с учетом значений по умолчанию."""
+    url = raw.get('url') or None
+    input_path = raw.get('input') or None
+    if not url and not input_path:
+        raise ValueError(f"Задание {index}: нужно указать url или input")
+    if input_path and not os.path.isabs(input_path):
+        input_path = str(base_dir / input_path)
+
+    effects = None
+    base_effects = dict(defaults.get('effects') or {})
+    base_effects.update(raw.get('effects') or {})
+    if defaults.get('effects') is not None or raw.get('effects') is not None:
+        effects = _make_effects(base_effects, base_dir)
+
+    variants = None
+    sampling = None
+    if isinstance(raw.get('variants'), dict):
+        spec = raw['variants']
+        sampling = {
+            'count': int(spec.get('count', 1)),
+            # Без заданного зерна выбираем его сами и сохраняем в описании вариантов
+            'seed': spec['seed'] if spec.get('seed') is not None else random.randrange(2 ** 31),
+            'ranges': {key: tuple(value) if isinstance(value, list) else value
+                       for key, value in (spec.get('ranges') or DEFAULT_RANGES).items()},
+            'base': _make_effects(base_effects, base_dir),
+        }
+        # Ошибки в диапазонах сообщаем при чтении манифеста, а не во время обработки
+        sample_variant(sampling['seed'], 0, sampling['ranges'], sampling['base'])
+    elif raw.get('variants'):
+        variants = [_make_effects({**base_effects, **variant}, base_dir) for variant in raw['variants']]
+
+    convert = raw.get('convert', defaults.get('convert')) or None
+    if convert and convert not in VIDEO_FORMATS:
+        raise ValueError(f"Задание {index}: неизвестный формат конвертации '{convert}'")
+
+    return BatchJob(
+        index=index,
+        url=url,
+        input=input_path,
+        name=raw.get('name') or None,
+        effects=effects,
+        variants=variants,
+        sampling=sampling,
+        convert=convert,
+        copy_audio=_parse_bool(raw.get('copy_audio', defaults.get('copy_audio', True))),
+        reencode=_parse_bool(raw.get('reencode', defaults.get('reencode', False))),
+    )
+
+
+def _read_csv_rows(path: Path) -> List[Dict[str, Any]]:
+    """Читает задания из CSV: пустые ячейки пропускаются, параметры эффектов собираются в effects."""
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            raw: Dict[str, Any] = {}
+            effects = {}
+            for key, value in row.items():
+                if key is None or value is None or value.strip() == '':
+                    continue
+                key = key.strip()
+                if key in DEFAULT_EFFECTS:
+                    effects[key] = value.strip()
+                else:
+                    raw[key] = value.strip()
+            if effects:
+                raw['effects'] = effects
+            rows.append(raw)
+    return rows
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """
+    Загружает манифест заданий.
+
+    Возвращает словарь с ключами jobs (список BatchJob) и, если заданы в
+    манифесте, output_dir и workers.
+    """
+    manifest_path = Path(path)
+    base_dir = manifest_path.resolve().parent
+    settings: Dict[str, Any] = {}
+    defaults: Dict[str, Any] = {}
+
+    if manifest_path.suffix.lower() == '.csv':
+        rows = _read_csv_rows(manifest_path)
+    else:
+        with open(manifest_path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            rows = data
+        else:
+            rows = data.get('jobs', [])
+            defaults = data.get('defaults', {})
+            for key in ('output_dir', 'workers'):
+                if key in data:
+                    settings[key] = data[key]
+        if settings.get('output_dir') and not os.path.isabs(settings['output_dir']):
+            settings['output_dir'] = str(base_dir / settings['output_dir'])
+
+    jobs = [_make_job(i, raw, defaults, base_dir) for i, raw in enumerate(rows, start=1)]
+
+    # Одинаковые имена файлов в разных заданиях перезаписывали бы друг друга. Без
+    # явного имени результаты называются по входному файлу, поэтому он тоже учитывается
+    # (скачанные файлы получают уникальные имена при скачивании)
+    names = {job.index: job.name or (Path(job.input).stem if job.input else None) for job in jobs}
+    seen = Counter(name for name in names.values() if name)
+    for job in jobs:
+        name = names[job.index]
+        if name and seen[name] > 1:
+            job.name = f"{name}_{job.index}"
+
+    settings['jobs'] = jobs
+    return settings
+
+
+def _job_effects(job: BatchJob) -> List[Dict[str, Any]]:
+    """Параметры эффектов всех результатов задания (случайные варианты выбираются заранее)."""
+    if job.sampling:
+        # Слои не зависят от высоты видео, поэтому выборка без video_h дает те же ключи
+        return sample_variants(job.sampling['count'], job.sampling['seed'], job.sampling['ranges'],
+                               job.sampling['base'])
+    if job.variants:
+        return job.variants
+    return [job.effects] if job.effects is not None else []
+
+
+def _reused_layers(jobs: List[BatchJob]) -> Set[tuple]:
+    """Слои фона и watermark, которые нужны больше чем одному результату."""
+    counts = Counter(key for job in jobs for effects in _job_effects(job) for key in layer_keys(effects))
+    return {key for key, count in counts.items() if count > 1}
+
+
+def _write_variants_info(path: Path, job: BatchJob, variants: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """Сохраняет параметры вариантов, чтобы любой результат можно было воспроизвести."""
+    data: Dict[str, Any] = {'source': job.title}
+    if job.sampling:
+        data['seed'] = job.sampling['seed']
+        data['ranges'] = job.sampling['ranges']
+    data['variants'] = [
+        {'index': index, 'output': os.path.basename(output), 'effects': effects}
+        for index, (output, effects) in enumerate(variants)
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return str(path)
+
+
+def process_job(job: BatchJob, output_dir: Path, download_dir: Path,
+                segment_workers: Optional[int] = None,
+                intermediates: Optional[IntermediateCache] = None) -> List[str]:
+    """
+    Выполняет одно задание и возвращает пути к созданным файлам.
+
+    Если задан segment_workers, длинные видео уникализируются по частям
+    в указанное количество процессов. Если задан intermediates, видео фона и
+    watermark обрабатываются один раз и переиспользуются между заданиями.
+    """
+    source = job.input
+    if job.url:
+        _log(f"[{job.index}] Скачивание: {job.url}")
+        source = download_url(job.url, download_dir)
+        job.outputs.append(source)
+    if not source or not os.path.exists(source):
+        raise FileNotFoundError(f"Файл не найден: {source}")
+
+    stem, ext = os.path.splitext(os.path.basename(source))
+    name = job.name or stem
+
+    sources = [source]
+    if job.sampling:
+        info = probe(source)
+        job.variants = sample_variants(job.sampling['count'], job.sampling['seed'], job.sampling['ranges'],
+                                       job.sampling['base'], video_h=info.height)
+    if job.variants:
+        info = probe(source)
+        variants = [(str(output_dir / f"{name}_unique{number}{ext}"), effects)
+                    for number, effects in enumerate(job.variants, start=1)]
+        _log(f"[{job.index}] Уникализация: {os.path.basename(source)}, вариантов: {len(variants)}")
+        if not encode_variants(source, variants, info.width, info.height, intermediates=intermediates):
+            raise RuntimeError("Создание вариантов было остановлено")
+        sources = [path for path, _ in variants]
+        job.outputs.extend(sources)
+        job.outputs.append(_write_variants_info(output_dir / f"{name}_variants.json", job, variants))
+    elif job.effects is not None:
+        info = probe(source)
+        width, height = info.width, info.height
+        if build_effects_filter(job.effects, width, height):
+            output_path = str(output_dir / f"{name}_unique{ext}")
+            _log(f"[{job.index}] Уникализация: {os.path.basename(source)}")
+            if segment_workers and should_encode_segmented(source, info.duration):
+                if not encode_segmented(source, output_path, job.effects, width, height,
+                                        workers=segment_workers, intermediates=intermediates):
+                    raise RuntimeError("Обработка по частям была остановлена")
+            elif intermediates:
+                spec = intermediates.prepare(job.effects, width, height)
+                if spec is None:
+                    raise RuntimeError("Подготовка фона и watermark была остановлена")
+                run_ffmpeg(build_effects_command(source, output_path, spec, width, height, prerendered=True))
+            else:
+                run_ffmpeg(build_effects_command(source, output_path, job.effects, width, height))
+            job.outputs.append(output_path)
+            sources = [output_path]
+        else:
+            _log(f"[{job.index}] Эффекты не выбраны, уникализация пропущена")
+
+    if job.convert:
+        extension = VIDEO_FORMATS[job.convert]['extension']
+        _log(f"[{job.index}] Конвертация в {job.convert.upper()}")
+        for source in sources:
+            stem = os.path.splitext(os.path.basename(source))[0] if len(sources) > 1 else name
+            output_path = str(output_dir / f"{stem}_lossless.{extension}")
+            run_ffmpeg(create_convert_command(source, output_path, job.convert, job.copy_audio,
+                                              info=probe(source), force_reencode=job.reencode))
+            job.outputs.append(output_path)
+
+    return job.outputs
+
+
+def run_batch(jobs: List[BatchJob], output_dir: str, workers: int = DEFAULT_WORKERS,
+              download_dir: Optional[str] = None, segmented: bool = False,
+              cache_dir: Optional[str] = None) -> int:
+    """Выполняет задания параллельно. Возвращает количество неудачных заданий."""
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    download_path = Path(download_dir) if download_dir else output_path / 'downloads'
+    # Заранее рендерятся только слои, которые переиспользуются: слой одного
+    # результата дешевле наложить сразу, чем сначала записать в кэш
+    reused = _reused_layers(jobs)
+    intermediates = IntermediateCache(cache_dir or str(output_path / 'cache')) if reused else None
+
+    # Ядра делятся между одновременно выполняемыми заданиями
+    segment_workers = max(1, (os.cpu_count() or 1) // max(1, workers)) if segmented else None
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {}
+        for job in jobs:
+            uses_cache = any(key in reused for effects in _job_effects(job) for key in layer_keys(effects))
+            futures[executor.submit(process_job, job, output_path, download_path, segment_workers,
+                                    intermediates if uses_cache else None)] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                outputs = future.result()
+                _log(f"[{job.index}] Готово: {', '.join(outputs) or '-'}")
+            except Exception as e:
+                failed += 1
+                log_error(f"Ошибка пакетной обработки: {e}", job.title)
+                _log(f"[{job.index}] Ошибка: {e}")
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Точка входа консольной утилиты vidify-batch."""
+    parser = argparse.ArgumentParser(
+        prog='vidify-batch',
+        description='Пакетное скачивание, уникализация и конвертация видео без графического интерфейса.'
+    )
+    parser.add_argument('manifest', help='файл манифеста заданий (.json или .csv)')
+    parser.add_argument('-o', '--output-dir', help='папка для результатов (по умолчанию ./output)')
+    parser.add_argument('-w', '--workers', type=int, help=f'количество параллельных заданий (по умолчанию {DEFAULT_WORKERS})')
+    parser.add_argument('--download-dir', help='папка для скачанных видео (по умолчанию <output-dir>/downloads)')
+    parser.add_argument('--segmented', action='store_true',
+                        help='уникализировать длинные видео по частям в несколько процессов')
+    parser.add_argument('--cache-dir', help='папка для обработанных видео фона и watermark (по умолчанию <output-dir>/cache)')
+    args = parser.parse_args(argv)
+
+    try:
+        manifest = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения манифеста: {e}", file=sys.stderr)
+        return 2
+
+    if not check_ffmpeg_available():
+        print("FFmpeg не найден в системе.", file=sys.stderr)
+        return 2
+
+    jobs = manifest['jobs']
+    output_dir = args.output_dir or manifest.get('output_dir') or 'output'
+    workers = args.workers or manifest.get('workers') or DEFAULT_WORKERS
+
+    _log(f"Заданий: {len(jobs)}, потоков: {workers}")
+    failed = run_batch(jobs, output_dir, workers, args.download_dir, args.segmented, args.cache_dir)
+    _log(f"Завершено: {len(jobs) - failed} из {len(jobs)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
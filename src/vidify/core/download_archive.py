@@ -0,0 +1,103 @@
+"""
+Архив скачанных видео.
+
+Для каждого скачанного видео в SQLite сохраняются экстрактор и ID (ключ),
+путь к файлу, его размер, время изменения и SHA-256. Перед скачиванием загрузчик ищет видео в
+архиве и, если файл на месте и не изменился, возвращает его вместо повторной
+загрузки.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+
+# Размер блока при подсчете контрольной суммы
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_checksum(path: Union[str, Path]) -> str:
+    """SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadArchive:
+    """Архив скачанных видео в файле SQLite (одно соединение, доступ под блокировкой)."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "extractor TEXT NOT NULL, video_id TEXT NOT NULL, path TEXT NOT NULL, "
+                "size INTEGER NOT NULL, sha256 TEXT NOT NULL, added REAL NOT NULL, "
+                "mtime_ns INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (extractor, video_id))"
+            )
+            # Архивы прежних версий не хранили время изменения: такие файлы проверяются
+            # по контрольной сумме один раз, после чего время записывается
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(downloads)")}
+            if 'mtime_ns' not in columns:
+                self._db.execute("ALTER TABLE downloads ADD COLUMN mtime_ns INTEGER NOT NULL DEFAULT 0")
+
+    def lookup(self, extractor: str, video_id: str) -> Optional[str]:
+        """
+        Возвращает путь к ранее скачанному видео или None.
+
+        Если файл удален или изменились его размер или содержимое (SHA-256),
+        запись удаляется. Контрольная сумма пересчитывается, только если
+        изменилось время изменения файла, и без блокировки архива.
+        """
+        key = (extractor.lower(), video_id)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT path, size, sha256, mtime_ns FROM downloads WHERE extractor = ? AND video_id = ?", key
+            ).fetchone()
+        if row is None:
+            return None
+        path, size, checksum, mtime_ns = row
+        try:
+            stat = os.stat(path)
+            # Размер проверяется первым: так большинство замененных файлов отсеивается без чтения
+            valid = stat.st_size == size and (stat.st_mtime_ns == mtime_ns or file_checksum(path) == checksum)
+        except OSError:
+            valid = False
+        if valid and stat.st_mtime_ns != mtime_ns:
+            # Содержимое не изменилось (например, файл скопирован): запоминаем новое время
+            with self._lock, self._db:
+                self._db.execute(
+                    "UPDATE downloads SET mtime_ns = ? WHERE extractor = ? AND video_id = ? AND path = ?",
+                    (stat.st_mtime_ns, *key, path)
+                )
+        if not valid:
+            with self._lock, self._db:
+                self._db.execute("DELETE FROM downloads WHERE extractor = ? AND video_id = ? AND path = ?",
+                                 (*key, path))
+            return None
+        return path
+
+    def add(self, extractor: str, video_id: str, path: Union[str, Path]) -> None:
+        """Записывает скачанное видео в архив (контрольная сумма считается здесь)."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        checksum = file_checksum(path)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO downloads (extractor, video_id, path, size, sha256, added, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (extractor.lower(), video_id, path, stat.st_size, checksum, time.time(), stat.st_mtime_ns)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,188 @@
+"""
+Менеджер очереди скачиваний с ограниченным пулом потоков.
+"""
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from vidify.core.downloader import DownloadAborted, download_url, log_error, progress_percent
+
+
+# Количество одновременных скачиваний по умолчанию
+DEFAULT_MAX_WORKERS = min(4, (os.cpu_count() or 1) + 1)
+
+
+class DownloadJobStatus(Enum):
+    """Статус отдельной задачи в очереди."""
+    QUEUED = "В очереди"
+    DOWNLOADING = "Скачивание..."
+    FINISHED = "Готово"
+    ERROR = "Ошибка"
+    CANCELED = "Отменено"
+
+
+@dataclass
+class DownloadJob:
+    """Задача скачивания одной ссылки."""
+    job_id: int
+    url: str
+    save_path: Path
+    format_id: Optional[str] = None
+    status: DownloadJobStatus = DownloadJobStatus.QUEUED
+    progress: int = 0
+    filepath: Optional[str] = None
+    error: Optional[str] = None
+    _abort: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def is_done(self) -> bool:
+        """Задача завершена (успешно, с ошибкой или отменена)."""
+        return self.status in (DownloadJobStatus.FINISHED, DownloadJobStatus.ERROR, DownloadJobStatus.CANCELED)
+
+
+class DownloadManager(QObject):
+    """
+    Очередь скачиваний: принимает список ссылок и выполняет до max_workers
+    загрузок одновременно. Сигналы испускаются из рабочих потоков и
+    доставляются в GUI-поток через очередь событий Qt.
+    """
+    job_added = pyqtSignal(int, str)       # job_id, url
+    job_progress = pyqtSignal(int, int)    # job_id, процент
+    job_status = pyqtSignal(int, str)      # job_id, текст статуса
+    job_finished = pyqtSignal(int, str)    # job_id, путь к файлу
+    job_failed = pyqtSignal(int, str)      # job_id, текст ошибки
+    queue_finished = pyqtSignal()          # все задачи завершены
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, parent=None):
+        super().__init__(parent)
+        self.max_workers = max(1, int(max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='vidify-download')
+        self._jobs: Dict[int, DownloadJob] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # Очередь получила задачи после последнего queue_finished
+        self._queue_active = False
+
+    @property
+    def jobs(self) -> List[DownloadJob]:
+        """Все задачи в порядке добавления."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active_count(self) -> int:
+        """Количество скачиваемых сейчас задач."""
+        return sum(1 for job in self.jobs if job.status == DownloadJobStatus.DOWNLOADING)
+
+    def pending_count(self) -> int:
+        """Количество задач, ожидающих свободного потока."""
+        return sum(1 for job in self.jobs if job.status == DownloadJobStatus.QUEUED)
+
+    def is_busy(self) -> bool:
+        """Есть ли незавершенные задачи."""
+        return any(not job.is_done for job in self.jobs)
+
+    def total_progress(self) -> int:
+        """Суммарный прогресс по всем задачам текущей очереди (в процентах)."""
+        jobs = [job for job in self.jobs if job.status != DownloadJobStatus.CANCELED]
+        if not jobs:
+            return 0
+        return int(sum(100 if job.is_done else job.progress for job in jobs) / len(jobs))
+
+    def add_url(self, url: str, save_path, format_id: str = None) -> DownloadJob:
+        """Добавляет ссылку в очередь скачивания."""
+        job = DownloadJob(job_id=next(self._ids), url=url, save_path=Path(save_path), format_id=format_id)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._queue_active = True
+        self.job_added.emit(job.job_id, url)
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def add_urls(self, urls: Iterable[str], save_path, format_id: str = None) -> List[DownloadJob]:
+        """Добавляет в очередь список ссылок."""
+        return [self.add_url(url, save_path, format_id) for url in urls]
+
+    def clear_finished(self) -> None:
+        """Удаляет завершенные задачи из списка."""
+        with self._lock:
+            self._jobs = {job_id: job for job_id, job in self._jobs.items() if not job.is_done}
+
+    def cancel(self, job_id: int) -> None:
+        """Отменяет задачу по идентификатору."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job and not job.is_done:
+            job._abort.set()
+
+    def cancel_all(self) -> None:
+        """Отменяет все незавершенные задачи."""
+        for job in self.jobs:
+            if not job.is_done:
+                job._abort.set()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Отменяет задачи и останавливает пул потоков."""
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
+
+    def _run_job(self, job: DownloadJob) -> None:
+        """Выполняет задачу в рабочем потоке."""
+        if job._abort.is_set():
+            self._set_status(job, DownloadJobStatus.CANCELED)
+            self._check_queue_finished()
+            return
+
+        self._set_status(job, DownloadJobStatus.DOWNLOADING)
+
+        def hook(d):
+            status = d.get('status')
+            if status == 'downloading':
+                percent = progress_percent(d)
+            elif status == 'finished':
+                # Файл скачан, но постобработка (слияние дорожек) еще идет
+                percent = 99
+            else:
+                return
+            # Испускаем сигнал только при изменении процента
+            if percent != job.progress:
+                job.progress = percent
+                self.job_progress.emit(job.job_id, percent)
+
+        try:
+            job.filepath = download_url(job.url, job.save_path, job.format_id,
+                                        progress_hook=hook, is_aborted=job._abort.is_set)
+            job.progress = 100
+            self.job_progress.emit(job.job_id, 100)
+            self._set_status(job, DownloadJobStatus.FINISHED)
+            self.job_finished.emit(job.job_id, job.filepath)
+        except Exception as e:
+            if job._abort.is_set() or isinstance(e, DownloadAborted):
+                self._set_status(job, DownloadJobStatus.CANCELED)
+            else:
+                log_error(f"Ошибка при скачивании: {e}", job.url)
+                job.error = str(e)
+                self._set_status(job, DownloadJobStatus.ERROR)
+                self.job_failed.emit(job.job_id, job.error)
+        finally:
+            self._check_queue_finished()
+
+    def _set_status(self, job: DownloadJob, status: DownloadJobStatus) -> None:
+        job.status = status
+        self.job_status.emit(job.job_id, status.value)
+
+    def _check_queue_finished(self) -> None:
+        # Последние задачи могут завершиться одновременно в разных потоках:
+        # проверка и сброс флага под блокировкой дают ровно один сигнал
+        with self._lock:
+            finished = self._queue_active and all(job.is_done for job in self._jobs.values())
+            if finished:
+                self._queue_active = False
+        if finished:
+            self.queue_finished.emit()
@@ -4,19 +4,26 @@
 import re
 import os
 import sys
+import shutil
 import json
+import sqlite3
 import subprocess
+import threading
 import urllib.request
 import urllib.parse
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
-from typing import Optional, Tuple, List, Dict, Any, Callable
+from typing import Optional, Tuple, List, Dict, Any, Callable, Iterator
 from functools import lru_cache
 
 import yt_dlp
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from vidify.core.download_archive import DownloadArchive
+from vidify.core.metadata_cache import MetadataCache, normalize_url
+
 
 class DownloadStatus(Enum):
     """Статус скачивания."""
@@ -24,7 +31,6 @@ class DownloadStatus(Enum):
     DOWNLOADING = "Скачивание..."
     CANCELED = "Отменено"
     PREPARE = "Подготовка..."
-    ALREADY = "Уже идет скачивание"
     NO_URL = "Введите ссылку"
     FOLDER_CHOSEN = "Папка: {folder}"
     ERROR = "Ошибка: {error}"
@@ -34,6 +40,36 @@ class DownloadStatus(Enum):
 
 VIDEO_EXTS = ["mp4", "webm", "mkv", "mov", "avi"]
 
+# Параметры yt_dlp для получения информации о видео
+INFO_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'skip_download': True,
+    'writeinfojson': False,
+    'writedescription': False,
+    'writesubtitles': False,
+    'writeannotations': False,
+    'writethumbnail': False,
+    'write_all_thumbnails': False,
+    'simulate': True,
+    'extract_flat': True,
+    'socket_timeout': 5,  # Ограничиваем время ожидания
+    'nocheckcertificate': True,  # Ускоряем загрузку
+}
+
+# Параметры yt_dlp для скачивания (формат и шаблон имени задаются для каждого файла)
+DOWNLOAD_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+    'socket_timeout': 10,  # Увеличиваем время ожидания для скачивания
+    'nocheckcertificate': True,  # Ускоряем скачивание
+}
+
+# Сколько свободных экземпляров YoutubeDL хранить для каждого набора параметров
+MAX_IDLE_SESSIONS = 4
+
 
 def is_valid_url(url: str) -> bool:
     """Проверяет валидность URL."""
@@ -111,6 +147,136 @@ def extract_video_id(url: str) -> Optional[str]:
     return None
 
 
+_metadata_cache: Optional[MetadataCache] = None
+_metadata_cache_lock = threading.Lock()
+
+
+def metadata_cache() -> MetadataCache:
+    """Общий кэш информации о видео (файл создается при первом обращении)."""
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = MetadataCache(Path(__file__).parent.parent / 'data' / 'metadata_cache.sqlite3')
+        return _metadata_cache
+
+
+_download_archive: Optional[DownloadArchive] = None
+_download_archive_lock = threading.Lock()
+
+
+def download_archive() -> DownloadArchive:
+    """Общий архив скачанных видео (файл создается при первом обращении)."""
+    global _download_archive
+    with _download_archive_lock:
+        if _download_archive is None:
+            _download_archive = DownloadArchive(Path(__file__).parent.parent / 'data' / 'download_archive.sqlite3')
+        return _download_archive
+
+
+def get_cached_info(url: str) -> Optional[Dict[str, Any]]:
+    """Возвращает сохраненную информацию о видео по ссылке или None."""
+    try:
+        return metadata_cache().get(normalize_url(url, extract_video_id(url)))
+    except sqlite3.Error as e:
+        log_error(f"Ошибка кэша метаданных: {e}", url)
+        return None
+
+
+def remember_info(url: str, info: Dict[str, Any]) -> None:
+    """Сохраняет информацию о видео в кэш (ошибки кэша не прерывают работу)."""
+    try:
+        metadata_cache().put(normalize_url(url, extract_video_id(url)), info)
+    except sqlite3.Error as e:
+        log_error(f"Ошибка кэша метаданных: {e}", url)
+
+
+def simple_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Оставляет из информации yt_dlp только поля, которые показываются и кэшируются."""
+    return {
+        'title': info.get('title', 'Без названия'),
+        'uploader': info.get('uploader', 'Неизвестно'),
+        'thumbnail': info.get('thumbnail'),
+        'id': info.get('id', ''),
+        'extractor': info.get('extractor_key') or info.get('ie_key') or '',
+    }
+
+
+class _Session:
+    """Экземпляр YoutubeDL и обработчик прогресса задачи, которая его сейчас использует."""
+
+    def __init__(self, options: Dict[str, Any]):
+        self.hook: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.ydl = yt_dlp.YoutubeDL({**options, 'progress_hooks': [self._dispatch]})
+
+    def _dispatch(self, d: Dict[str, Any]) -> None:
+        if self.hook:
+            self.hook(d)
+
+    def set_outtmpl(self, outtmpl: str) -> None:
+        """
+        Меняет шаблон имени видео.
+
+        yt_dlp хранит шаблоны словарем по типам файлов; остальные шаблоны
+        (миниатюры, субтитры) остаются без изменений.
+        """
+        self.ydl.params['outtmpl']['default'] = outtmpl
+
+
+class YoutubeDLPool:
+    """
+    Пул готовых экземпляров yt_dlp.YoutubeDL.
+
+    Создание YoutubeDL (инициализация экстракторов, cookies, HTTP-клиента)
+    выполняется один раз, после чего экземпляр переиспользуется следующими
+    запросами с теми же параметрами. Экземпляр выдается только одному потоку
+    за раз, поэтому пул можно использовать из нескольких потоков.
+    """
+
+    def __init__(self, max_idle: int = MAX_IDLE_SESSIONS):
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple, List[_Session]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self, options: Dict[str, Any], outtmpl: Optional[str] = None,
+                progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[Any]:
+        """Выдает YoutubeDL с параметрами options на время блока with."""
+        key = tuple(sorted(options.items()))
+        with self._lock:
+            idle = self._idle.get(key)
+            session = idle.pop() if idle else None
+        if session is None:
+            session = _Session(options)
+        if outtmpl:
+            session.set_outtmpl(outtmpl)
+        session.hook = progress_hook
+        try:
+            yield session.ydl
+        except BaseException:
+            # После ошибки состояние экземпляра неизвестно, поэтому он не возвращается в пул
+            session.ydl.close()
+            raise
+        session.hook = None
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(session)
+                return
+        session.ydl.close()
+
+    def close(self) -> None:
+        """Закрывает все свободные экземпляры."""
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.ydl.close()
+
+
+# Общий пул для получения информации и скачивания
+ydl_pool = YoutubeDLPool()
+
+
 class VideoInfoFetcher(QThread):
     """Поток для получения информации о видео."""
     info_ready = pyqtSignal(dict)
@@ -134,12 +300,16 @@ class VideoInfoFetcher(QThread):
             # Проверяем, является ли URL ссылкой на YouTube
             video_id = extract_video_id(self.url)
             
-            if video_id:
-                # Для YouTube используем быстрый метод через API
-                info = self._get_youtube_info(video_id)
-            else:
-                # Для других платформ используем yt_dlp с оптимизациями
-                info = self._get_info_via_ytdlp()
+            # Уже известные ссылки берем из кэша без обращения к сети
+            info = get_cached_info(self.url)
+            if info is None:
+                if video_id:
+                    # Для YouTube используем быстрый метод через API
+                    info = self._get_youtube_info(video_id)
+                else:
+                    # Для других платформ используем yt_dlp с оптимизациями
+                    info = self._get_info_via_ytdlp()
+                remember_info(self.url, info)
                 
             if self._abort:
                 return
@@ -164,7 +334,8 @@ class VideoInfoFetcher(QThread):
                 'title': data.get('title', 'Без названия'),
                 'uploader': data.get('author_name', 'Неизвестно'),
                 'thumbnail': f"https://i.ytimg.com/vi/{video_id}/mqdefault.jpg",  # Прямой URL к миниатюре
-                'id': video_id
+                'id': video_id,
+                'extractor': 'Youtube'
             }
             return info
         except Exception:
@@ -173,35 +344,215 @@ class VideoInfoFetcher(QThread):
     
     def _get_info_via_ytdlp(self) -> Dict:
         """Получает информацию о видео через yt_dlp."""
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'noplaylist': True,
-            'skip_download': True,
-            'writeinfojson': False,
-            'writedescription': False,
-            'writesubtitles': False,
-            'writeannotations': False,
-            'writethumbnail': False,
-            'write_all_thumbnails': False,
-            'simulate': True,
-            'extract_flat': True,
-            'socket_timeout': 5,  # Ограничиваем время ожидания
-            'nocheckcertificate': True,  # Ускоряем загрузку
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ydl_pool.session(INFO_OPTIONS) as ydl:
             info = ydl.extract_info(self.url, download=False, process=False)
             
             # Создаем упрощенный объект
-            simple_info = {
-                'title': info.get('title', 'Без названия'),
-                'uploader': info.get('uploader', 'Неизвестно'),
-                'thumbnail': info.get('thumbnail'),
-                'id': info.get('id', '')
-            }
-            
-            return simple_info
+            return simple_info(info)
+
+
+class DownloadAborted(Exception):
+    """Скачивание отменено пользователем."""
+
+
+# Имена, занятые в папке загрузок: видео, временные файлы yt_dlp и метки резервирования
+_VIDEO_NAME_RE = re.compile(r'^\.?video(\d+)\.')
+
+
+class _NameAllocator:
+    """
+    Выдает свободные имена вида video{i} в одной папке.
+
+    Папка просматривается один раз, после чего номера выдаются счетчиком.
+    Имя закрепляется меткой .video{i}.lock, созданной с O_EXCL, поэтому два
+    скачивания (в том числе из разных процессов) не получат одно имя.
+    """
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+        self._next: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _scan(self) -> int:
+        """Следующий номер после наибольшего из уже занятых."""
+        highest = 0
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                match = _VIDEO_NAME_RE.match(entry.name)
+                if match:
+                    highest = max(highest, int(match.group(1)))
+        return highest + 1
+
+    def reserve(self) -> str:
+        with self._lock:
+            if self._next is None:
+                self._next = self._scan()
+            while True:
+                name = f"video{self._next}"
+                self._next += 1
+                # Файл мог появиться после просмотра папки (например, скопирован вручную)
+                if any((self.folder / f"{name}.{ext}").exists() for ext in VIDEO_EXTS):
+                    continue
+                try:
+                    fd = os.open(self.folder / f".{name}.lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    continue
+                os.close(fd)
+                return name
+
+    def release(self, name: str) -> None:
+        try:
+            os.remove(self.folder / f".{name}.lock")
+        except OSError:
+            pass
+
+
+_allocators: Dict[str, _NameAllocator] = {}
+_allocators_lock = threading.Lock()
+
+
+def _allocator(save_path: Path) -> _NameAllocator:
+    key = os.path.normcase(str(save_path.resolve()))
+    with _allocators_lock:
+        allocator = _allocators.get(key)
+        if allocator is None:
+            allocator = _allocators[key] = _NameAllocator(save_path)
+        return allocator
+
+
+def _reserve_video_name(save_path: Path) -> str:
+    """Подбирает и резервирует свободное имя вида video{i} в папке."""
+    return _allocator(save_path).reserve()
+
+
+def _release_video_name(save_path: Path, name: str) -> None:
+    """Освобождает зарезервированное имя."""
+    _allocator(save_path).release(name)
+
+
+def _archive_key(url: str) -> Optional[Tuple[str, str]]:
+    """Экстрактор и ID видео, если их можно узнать без обращения к сети."""
+    video_id = extract_video_id(url)
+    if video_id:
+        return 'Youtube', video_id
+    info = get_cached_info(url)
+    if info and info.get('extractor') and info.get('id'):
+        return info['extractor'], info['id']
+    return None
+
+
+def _find_archived(extractor: str, video_id: str, url: str, save_path: Path) -> Optional[str]:
+    """
+    Путь к уже скачанному видео из архива (ошибки архива не прерывают скачивание).
+
+    Если видео скачивалось в другую папку, в save_path создается жесткая
+    ссылка на файл (или копия, если папки на разных дисках), чтобы результат
+    всегда оказывался в выбранной папке.
+    """
+    try:
+        existing = download_archive().lookup(extractor, video_id)
+    except sqlite3.Error as e:
+        log_error(f"Ошибка архива скачиваний: {e}", url)
+        return None
+    if not existing or Path(existing).parent.resolve() == save_path.resolve():
+        return existing
+    name = _reserve_video_name(save_path)
+    target = save_path / f"{name}{Path(existing).suffix}"
+    try:
+        try:
+            os.link(existing, target)
+        except OSError:
+            shutil.copy2(existing, target)
+    except OSError as e:
+        log_error(f"Не удалось скопировать видео из архива: {e}", url)
+        if target.exists():
+            target.unlink()
+        return None
+    finally:
+        _release_video_name(save_path, name)
+    return str(target)
+
+
+def _archive_download(info: Dict[str, Any], path: str, url: str) -> None:
+    """Добавляет скачанное видео в архив."""
+    extractor, video_id = info.get('extractor_key'), info.get('id')
+    if not extractor or not video_id:
+        return
+    try:
+        download_archive().add(extractor, video_id, path)
+    except (sqlite3.Error, OSError) as e:
+        log_error(f"Ошибка архива скачиваний: {e}", url)
+
+
+def download_url(url: str, save_path, format_id: str = None,
+                 progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 is_aborted: Optional[Callable[[], bool]] = None) -> str:
+    """
+    Скачивает видео по ссылке в папку save_path и возвращает путь к файлу.
+
+    progress_hook получает словари событий yt_dlp, is_aborted позволяет
+    прервать скачивание (проверяется при каждом событии прогресса).
+    Видео, которое уже есть в архиве скачиваний, не скачивается повторно:
+    возвращается путь к существующему файлу или к его ссылке в save_path
+    (только для формата по умолчанию).
+    Не зависит от Qt, поэтому используется и в потоках UI, и в пакетном режиме.
+    """
+    save_path = Path(save_path)
+    save_path.mkdir(parents=True, exist_ok=True)
+    use_archive = not format_id
+
+    # Известные ссылки проверяем по архиву еще до обращения к сети
+    key = _archive_key(url) if use_archive else None
+    if key:
+        existing = _find_archived(*key, url, save_path)
+        if existing:
+            return existing
+
+    def hook(d: Dict[str, Any]) -> None:
+        if is_aborted and is_aborted():
+            raise DownloadAborted("Загрузка отменена пользователем")
+        if progress_hook:
+            progress_hook(d)
+
+    # Генерируем уникальное имя файла
+    name = _reserve_video_name(save_path)
+    try:
+        outtmpl = str(save_path / f"{name}.%(ext)s")
+        options = {**DOWNLOAD_OPTIONS, 'format': format_id if format_id else 'bestvideo+bestaudio/best'}
+
+        with ydl_pool.session(options, outtmpl=outtmpl, progress_hook=hook) as ydl:
+            # Сначала только извлекаем информацию: ID видео может оказаться в архиве
+            info = ydl.extract_info(url, download=False, process=False)
+            if use_archive and info and info.get('extractor_key') and info.get('id'):
+                existing = _find_archived(info['extractor_key'], info['id'], url, save_path)
+                if existing:
+                    remember_info(url, simple_info(info))
+                    return existing
+            info = ydl.process_ie_result(info, download=True)
+        # Информация, полученная при скачивании, пригодится при повторной обработке ссылки
+        if info:
+            remember_info(url, simple_info(info))
+
+        # Проверяем, что файл скачался
+        for ext in VIDEO_EXTS:
+            candidate = save_path / f"{name}.{ext}"
+            if candidate.exists() and candidate.stat().st_size > 0:
+                if use_archive and info:
+                    _archive_download(info, str(candidate), url)
+                return str(candidate)
+
+        raise Exception("Файл не был скачан или пустой!")
+    finally:
+        _release_video_name(save_path, name)
+
+
+def progress_percent(d: Dict[str, Any]) -> int:
+    """Вычисляет процент скачивания по событию yt_dlp."""
+    total = d.get('_total_bytes_estimate') or d.get('total_bytes') or 0
+    downloaded = d.get('downloaded_bytes', 0)
+    if total > 0:
+        return min(int(downloaded * 100 / total), 100)
+    return 0
 
 
 class VideoDownloader(QThread):
@@ -229,18 +580,9 @@ class VideoDownloader(QThread):
 
     def ydl_hook(self, d: Dict[str, Any]) -> None:
         """Обработчик событий скачивания. Использует троттлинг для обновления UI."""
-        if self._abort:
-            raise Exception("Загрузка отменена пользователем")
-            
         status = d.get('status')
         if status == 'downloading':
-            total = d.get('_total_bytes_estimate') or d.get('total_bytes') or 0
-            downloaded = d.get('downloaded_bytes', 0)
-            
-            if total > 0:
-                percent = min(int(downloaded * 100 / total), 100)
-            else:
-                percent = 0
+            percent = progress_percent(d)
                 
             # Применяем троттлинг для обновлений UI
             self._progress_throttle_counter += 1
@@ -257,39 +599,11 @@ class VideoDownloader(QThread):
     def run(self) -> None:
         """Запускает скачивание."""
         try:
-            if not self.save_path.exists():
-                self.save_path.mkdir(parents=True, exist_ok=True)
-                
-            # Генерируем уникальное имя файла
-            i = 1
-            while any((self.save_path / f"video{i}.{ext}").exists() for ext in VIDEO_EXTS):
-                i += 1
-                
-            outtmpl = str(self.save_path / f"video{i}.%(ext)s")
-            
-            ydl_opts = {
-                'outtmpl': outtmpl,
-                'format': self.format_id if self.format_id else 'bestvideo+bestaudio/best',
-                'progress_hooks': [self.ydl_hook],
-                'quiet': True,
-                'no_warnings': True,
-                'noplaylist': True,
-                'socket_timeout': 10,  # Увеличиваем время ожидания для скачивания
-                'nocheckcertificate': True,  # Ускоряем скачивание
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([self.url])
-                
-            # Проверяем, что файл скачался
-            for ext in VIDEO_EXTS:
-                candidate = self.save_path / f"video{i}.{ext}"
-                if candidate.exists() and candidate.stat().st_size > 0:
-                    self._downloaded_filepath = str(candidate)
-                    break
-                    
-            if not self._downloaded_filepath:
-                raise Exception("Файл не был скачан или пустой!")
+            self._downloaded_filepath = download_url(
+                self.url, self.save_path, self.format_id,
+                progress_hook=self.ydl_hook,
+                is_aborted=lambda: self._abort,
+            )
                 
             # Устанавливаем прогресс в 100% только в самом конце
             self.update_progress.emit(100)
@@ -302,4 +616,4 @@ class VideoDownloader(QThread):
             self._error = str(e)
             self.finished_with_error.emit(DownloadStatus.ERROR.value.format(error=e))
         finally:
-            self._abort = False 
\ No newline at end of file
+            self._abort = False
@@ -0,0 +1,265 @@
+"""
+Построение фильтров FFmpeg для эффектов уникализации.
+
+Граф фильтров строится по неизменяемому EffectSpec без обращения к Qt и к
+файловой системе и кэшируется, поэтому экран уникализации, превью и пакетная
+обработка могут вызывать построитель сколько угодно раз. Наличие видео фона
+и watermark проверяется один раз, когда их выбирают (см. missing_inputs).
+"""
+import os
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# Настройки эффектов по умолчанию (совпадают с начальными значениями экрана уникализации)
+DEFAULT_EFFECTS: Dict[str, Any] = {
+    'flip': False,               # Отражение по горизонтали
+    'brightness': 0,             # Затемнение от 0 до 100 (0: нормальная яркость, 100: 25% затемнения)
+    'frame': False,              # Эффект рамки
+    'crop_top': 100,             # Обрезка сверху в пикселях
+    'crop_bottom': 100,          # Обрезка снизу в пикселях
+    'background_blur': 10,       # Размытие фона в пикселях
+    'background_darkness': 50,   # Затемнение фона в процентах
+    'background_scale': 120,     # Масштаб фона в процентах (от 100 до 200)
+    'background_video': '',      # Видео для фона рамки
+    'watermark_video': '',       # Видео водяного знака
+}
+
+
+def normalize_effects(effects: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Дополняет настройки эффектов значениями по умолчанию."""
+    result = dict(DEFAULT_EFFECTS)
+    if effects:
+        unknown = set(effects) - set(DEFAULT_EFFECTS)
+        if unknown:
+            raise ValueError(f"Неизвестные параметры эффектов: {', '.join(sorted(unknown))}")
+        result.update(effects)
+    return result
+
+
+@dataclass(frozen=True)
+class EffectSpec:
+    """Неизменяемые настройки эффектов (поля совпадают с DEFAULT_EFFECTS)."""
+    flip: bool = False
+    brightness: int = 0
+    frame: bool = False
+    crop_top: int = 100
+    crop_bottom: int = 100
+    background_blur: int = 10
+    background_darkness: int = 50
+    background_scale: int = 120
+    background_video: str = ''
+    watermark_video: str = ''
+
+    @classmethod
+    def from_dict(cls, effects: Optional[Dict[str, Any]]) -> 'EffectSpec':
+        """Создает настройки из словаря (недостающие параметры берутся по умолчанию)."""
+        return cls(**normalize_effects(effects))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @property
+    def inputs(self) -> Tuple[str, ...]:
+        """Дополнительные входные файлы в порядке, ожидаемом фильтром."""
+        if not self.frame:
+            return ()
+        return tuple(path for path in (self.background_video, self.watermark_video) if path)
+
+
+# Настройки в виде словаря или EffectSpec
+Effects = Union[EffectSpec, Dict[str, Any]]
+
+
+def as_spec(effects: Optional[Effects]) -> EffectSpec:
+    """Приводит настройки эффектов к EffectSpec."""
+    if isinstance(effects, EffectSpec):
+        return effects
+    return EffectSpec.from_dict(effects)
+
+
+@dataclass(frozen=True)
+class FilterGraph:
+    """Дополнительные входы и строка фильтра для одной команды ffmpeg."""
+    inputs: Tuple[str, ...] = ()
+    filter: Optional[str] = None
+
+    @property
+    def is_complex(self) -> bool:
+        """Нужен ли -filter_complex (граф с метками потоков) вместо -vf."""
+        return bool(self.filter) and '[' in self.filter
+
+
+def missing_inputs(effects: Effects) -> List[str]:
+    """Возвращает видео фона и watermark, которых нет на диске."""
+    return [path for path in as_spec(effects).inputs if not os.path.exists(path)]
+
+
+def _simple_filters(spec: EffectSpec) -> List[str]:
+    """Фильтры, которые применяются к кадру целиком (отражение и затемнение)."""
+    filters = []
+    if spec.flip:
+        filters.append("hflip")
+    if spec.brightness > 0:
+        brightness_normalized = -spec.brightness / 400.0
+        filters.append(f"eq=brightness={brightness_normalized:.2f}")
+    return filters
+
+
+def _background_blur(spec: EffectSpec) -> str:
+    """Размытие и затемнение фона рамки."""
+    darkness = spec.background_darkness
+    bg_darkness = -darkness / 100.0 * 0.7 if darkness > 0 else 0
+    blur_radius = spec.background_blur if spec.background_blur > 0 else 1
+    return f"boxblur=luma_radius={blur_radius}:luma_power=2,eq=brightness={bg_darkness:.2f}"
+
+
+def background_chain(effects: Effects, video_w: int, video_h: int) -> str:
+    """Цепочка фильтров, превращающая видео фона в готовый фон рамки."""
+    spec = as_spec(effects)
+    bg_scale = spec.background_scale / 100.0
+    return f"scale={video_w}:ih*{bg_scale:.2f},{_background_blur(spec)},crop={video_w}:{video_h}:0:0"
+
+
+def watermark_chain(video_w: int, video_h: int) -> str:
+    """Цепочка фильтров, превращающая видео watermark в полупрозрачный слой."""
+    return f"format=rgba,colorchannelmixer=aa=0.5,scale={video_w}:{video_h}"
+
+
+def build_effects_graph(effects: Effects, video_w: int, video_h: int, source: str = '0:v',
+                        background: Optional[str] = None, watermark: Optional[str] = None,
+                        output: Optional[str] = None, prefix: str = '',
+                        prerendered: bool = False) -> Optional[str]:
+    """
+    Строит граф фильтров с явными метками потоков.
+
+    source, background и watermark — метки входных потоков (видео фона и
+    watermark используются, только если метка задана), output — метка
+    результата (без нее выход графа остается безымянным). prefix добавляется
+    к внутренним меткам, чтобы несколько графов можно было объединить в один.
+    prerendered означает, что фон и watermark уже обработаны (см.
+    vidify.core.intermediates) и их нужно только наложить.
+    Возвращает None, если эффекты не выбраны.
+    """
+    spec = as_spec(effects)
+
+    def label(name: str) -> str:
+        return f"[{prefix}{name}]"
+
+    out = f"[{output}]" if output else ""
+    simple_filters = _simple_filters(spec)
+    if not spec.frame:
+        if simple_filters:
+            return f"[{source}]{','.join(simple_filters)}{out}"
+        return f"[{source}]null{out}" if output else None
+    if not video_w or not video_h:
+        return None
+
+    parts = []
+    src = f"[{source}]"
+    if simple_filters:
+        parts.append(f"{src}{','.join(simple_filters)}{label('pre')}")
+        src = label('pre')
+
+    bg_scale = spec.background_scale / 100.0
+    top_crop = spec.crop_top
+    bottom_crop = spec.crop_bottom
+    center_crop = f"crop=iw/({bg_scale:.2f}):ih/({bg_scale:.2f}):iw/2-iw/(2*{bg_scale:.2f}):ih/2-ih/(2*{bg_scale:.2f})"
+
+    # Фон из отдельного видео: передний план без обрезанных полос накладывается на него
+    wm = f"[{watermark}]"
+    if watermark and not prerendered:
+        parts.append(f"{wm}{watermark_chain(video_w, video_h)}{label('wm')}")
+        wm = label('wm')
+    if background:
+        base = f"[{background}]"
+        if not prerendered:
+            parts.append(f"{base}{background_chain(spec, video_w, video_h)}{label('bg')}")
+            base = label('bg')
+        if watermark:
+            parts.append(f"{base}{wm}overlay=(W-w)/2:(H-h)/2{label('bgwm')}")
+            base = label('bgwm')
+        parts.append(f"{src}crop=iw:ih-{top_crop}-{bottom_crop}:0:{top_crop}{label('fg')}")
+        parts.append(f"{base}{label('fg')}overlay=0:{top_crop}{out}")
+        return ";".join(parts)
+
+    # Фон из самого видео: увеличенная, размытая и затемненная копия кадра
+    new_height = f"ih-{top_crop + bottom_crop}"
+    vertical_offset = (bottom_crop - top_crop) // 2
+    parts.append(f"{src}split{label('main')}{label('bg')}")
+    parts.append(f"{label('bg')}scale=iw*{bg_scale:.2f}:ih*{bg_scale:.2f},{_background_blur(spec)}{label('bg_blurred')}")
+    base = label('bg_blurred')
+    if watermark:
+        parts.append(f"{label('bg_blurred')}{wm}overlay=(W-w)/2:(H-h)/2{label('bgwm')}")
+        base = label('bgwm')
+    parts.append(f"{label('main')}crop=iw:{new_height}:0:{top_crop}{label('fg')}")
+    parts.append(f"{base}{label('fg')}overlay=(W-w)/2:(H-h)/2-{vertical_offset}{label('combined')}")
+    parts.append(f"{label('combined')}{center_crop}{out}")
+    return ";".join(parts)
+
+
+@lru_cache(maxsize=256)
+def build_filter_graph(spec: EffectSpec, video_w: int, video_h: int, prerendered: bool = False) -> FilterGraph:
+    """
+    Возвращает входы и фильтр для команды с одним исходным видео.
+
+    Результат кэшируется по настройкам и размерам видео.
+    """
+    if not spec.frame:
+        # Простая цепочка без меток передается через -vf
+        return FilterGraph(filter=",".join(_simple_filters(spec)) or None)
+    # Дополнительные входы нумеруются в порядке spec.inputs начиная с 1
+    background = "1:v" if spec.background_video else None
+    watermark = f"{2 if background else 1}:v" if spec.watermark_video else None
+    graph = build_effects_graph(spec, video_w, video_h, background=background, watermark=watermark,
+                                prerendered=prerendered)
+    return FilterGraph(inputs=spec.inputs if graph else (), filter=graph)
+
+
+def build_effects_filter(effects: Effects, video_w: int, video_h: int) -> Optional[str]:
+    """Возвращает строку фильтра для ffmpeg с учетом выбранных эффектов."""
+    return build_filter_graph(as_spec(effects), video_w or 0, video_h or 0).filter
+
+
+def build_effects_command(input_path: str, output_path: str, effects: Effects,
+                          video_w: int, video_h: int, is_preview: bool = False,
+                          frame_time: str = "00:00:00.2", aux_offset: float = 0.0,
+                          audio: bool = True, extra_args: Optional[List[str]] = None,
+                          prerendered: bool = False) -> List[str]:
+    """
+    Создает команду ffmpeg для применения эффектов (полное видео или кадр превью).
+
+    aux_offset сдвигает начало видео фона и watermark (используется при
+    обработке видео по частям), audio=False отключает аудиодорожку,
+    extra_args добавляются перед выходным файлом, prerendered — фон и
+    watermark уже обработаны заранее.
+    """
+    graph = build_filter_graph(as_spec(effects), video_w or 0, video_h or 0, prerendered)
+    cmd = ['ffmpeg', '-y']
+    if is_preview:
+        cmd.extend(['-ss', frame_time])
+    cmd.extend(['-i', input_path])
+    for path in graph.inputs:
+        if is_preview:
+            cmd.extend(['-ss', frame_time])
+        elif aux_offset > 0:
+            cmd.extend(['-ss', f"{aux_offset:.3f}"])
+        cmd.extend(['-i', path])
+    if graph.is_complex:
+        cmd.extend(['-filter_complex', graph.filter])
+    elif graph.filter:
+        cmd.extend(['-vf', graph.filter])
+    if is_preview:
+        cmd.extend(['-frames:v', '1'])
+        # Запись одного кадра в файл-изображение (при выводе в pipe параметр не нужен)
+        if not output_path.startswith('pipe:'):
+            cmd.extend(['-update', '1'])
+    elif audio:
+        cmd.extend(['-c:a', 'copy'])
+    else:
+        cmd.append('-an')
+    if extra_args:
+        cmd.extend(extra_args)
+    cmd.append(output_path)
+    return cmd
@@ -0,0 +1,41 @@
+"""
+Кэш в памяти для результатов, вычисленных по содержимому файла.
+
+Ключ включает путь, размер и время изменения файла, поэтому после изменения
+файла старая запись просто перестает находиться и со временем вытесняется.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+def stat_key(path: str, *extra: Hashable) -> Tuple[Hashable, ...]:
+    """Ключ кэша для файла: путь, размер, время изменения и дополнительные параметры."""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns) + extra
+
+
+class LRUCache:
+    """Потокобезопасный кэш с вытеснением давно не использованных записей по количеству."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение по ключу или None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые старые записи."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,103 @@
+"""
+Лента миниатюр для шкалы времени редактора.
+
+Все миниатюры извлекаются одним запуском ffmpeg: декодируются только ключевые
+кадры, фильтр fps оставляет равномерно распределенные кадры, а scale уменьшает
+их до высоты ленты. Кадры читаются из stdout в формате rgb24 без временных
+файлов и кэшируются для каждого файла.
+"""
+import subprocess
+from dataclasses import dataclass
+from threading import Event
+from typing import Optional, Tuple
+
+from PyQt5.QtGui import QImage
+
+from vidify.core.file_cache import LRUCache, stat_key
+from vidify.core.preview_engine import image_from_rgb24
+from vidify.core.video_processor import start_process, terminate_process
+
+
+# Количество миниатюр в ленте
+FILMSTRIP_FRAMES = 24
+# Высота миниатюры в пикселях
+FILMSTRIP_HEIGHT = 72
+# Сколько лент хранить в памяти
+MAX_CACHED_FILMSTRIPS = 8
+
+
+@dataclass(frozen=True)
+class Filmstrip:
+    """Миниатюры, равномерно распределенные по длительности видео."""
+    times: Tuple[float, ...]
+    frames: Tuple[QImage, ...]
+    duration: float
+
+    def index_at(self, seconds: float) -> int:
+        """Номер миниатюры, ближайшей к указанному времени."""
+        if not self.times:
+            return -1
+        step = self.duration / len(self.times)
+        return min(len(self.times) - 1, max(0, int(seconds / step)))
+
+    def frame_at(self, seconds: float) -> Optional[QImage]:
+        """Миниатюра для указанного времени (для мгновенного показа при перемотке)."""
+        index = self.index_at(seconds)
+        return self.frames[index] if index >= 0 else None
+
+
+_cache = LRUCache(MAX_CACHED_FILMSTRIPS)
+
+
+def thumbnail_size(video_w: int, video_h: int, height: int = FILMSTRIP_HEIGHT) -> Tuple[int, int]:
+    """Размеры миниатюры с сохранением пропорций (четные, как требует yuv420p)."""
+    width = max(2, int(round(video_w * height / max(1, video_h) / 2)) * 2)
+    return width, height
+
+
+def generate_filmstrip(input_path: str, duration: float, video_w: int, video_h: int,
+                       count: int = FILMSTRIP_FRAMES, height: int = FILMSTRIP_HEIGHT,
+                       stop_event: Optional[Event] = None) -> Optional[Filmstrip]:
+    """
+    Извлекает count миниатюр одним процессом ffmpeg (или берет ленту из кэша).
+
+    Возвращает None, если извлечение было остановлено через stop_event.
+    """
+    if duration <= 0 or count <= 0:
+        raise ValueError("Для ленты миниатюр нужна длительность видео")
+    key = stat_key(input_path, count, height)
+    filmstrip = _cache.get(key)
+    if filmstrip is not None:
+        return filmstrip
+
+    width, height = thumbnail_size(video_w, video_h, height)
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        # Миниатюрам достаточно ключевых кадров: остальные не декодируются
+        '-skip_frame', 'nokey', '-i', input_path,
+        '-an', '-vf', f"fps={count}/{duration:.3f},scale={width}:{height}",
+        '-frames:v', str(count),
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+    ]
+    frame_size = width * height * 3
+    frames = []
+    process = start_process(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while len(frames) < count:
+            if stop_event and stop_event.is_set():
+                return None
+            data = process.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            frames.append(image_from_rgb24(data, width, height))
+    finally:
+        terminate_process(process)
+        process.stdout.close()
+        process.wait()
+    if not frames:
+        raise RuntimeError("Не удалось извлечь миниатюры для шкалы времени")
+
+    step = duration / len(frames)
+    filmstrip = Filmstrip(tuple(index * step for index in range(len(frames))), tuple(frames), duration)
+    _cache.put(key, filmstrip)
+    return filmstrip
@@ -0,0 +1,175 @@
+"""
+Кэш заранее обработанных видео фона и watermark.
+
+Фон рамки (масштаб, размытие, затемнение) и watermark (прозрачность, масштаб)
+одинаковы для сотен заданий, поэтому они один раз рендерятся в размер
+итогового видео и сохраняются в lossless-файл FFV1 из одних ключевых кадров.
+Основная обработка после этого только накладывает готовые слои.
+PrerenderedFFmpegProcessor выполняет подготовку слоев и обработку в одном
+потоке, поэтому обе стадии показывают прогресс и останавливаются через stop().
+"""
+import hashlib
+import os
+import threading
+from dataclasses import replace
+from threading import Event
+from typing import Callable, Dict, Optional, Tuple
+
+from vidify.core.effects import (
+    Effects, EffectSpec, as_spec, background_chain, build_effects_command, watermark_chain
+)
+from vidify.core.video_processor import FFmpegProcessor, FFmpegProgress, run_ffmpeg
+
+
+# Ограничение размера кэша по умолчанию
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024 * 1024
+
+
+def _file_signature(path: str) -> str:
+    """Путь, размер и время изменения файла (изменение файла дает новый ключ)."""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}@{stat.st_size}@{stat.st_mtime_ns}"
+
+
+def layer_keys(effects: Effects) -> Tuple[tuple, ...]:
+    """
+    Слои, которые подготовит prepare(), без учета размеров видео.
+
+    Одинаковые ключи у разных результатов означают, что слой можно отрендерить
+    один раз и переиспользовать.
+    """
+    spec = as_spec(effects)
+    if not spec.frame:
+        return ()
+    keys = []
+    if spec.background_video:
+        keys.append(('background', os.path.abspath(spec.background_video), spec.background_scale,
+                     spec.background_blur, spec.background_darkness))
+    if spec.watermark_video:
+        keys.append(('watermark', os.path.abspath(spec.watermark_video)))
+    return tuple(keys)
+
+
+class IntermediateCache:
+    """Готовые слои фона и watermark в папке cache_dir с вытеснением старых по объему."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, source: str, chain: str) -> str:
+        key = hashlib.sha1(f"{_file_signature(source)}\n{chain}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.mkv")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def render(self, source: str, chain: str, alpha: bool = False,
+               stop_event: Optional[Event] = None,
+               progress_callback: Optional[Callable[[FFmpegProgress], None]] = None) -> Optional[str]:
+        """
+        Возвращает путь к обработанной копии source (рендерит ее при первом обращении).
+
+        Возвращает None, если рендер был остановлен через stop_event.
+        """
+        path = self._path(source, chain)
+        # Один и тот же слой могут одновременно запросить несколько заданий
+        with self._lock(path):
+            if os.path.exists(path):
+                os.utime(path)
+                return path
+            temp_path = f"{path}.{threading.get_ident()}.tmp.mkv"
+            cmd = [
+                'ffmpeg', '-y', '-i', source, '-vf', chain, '-an',
+                '-c:v', 'ffv1', '-level', '3', '-g', '1',
+                '-pix_fmt', 'yuva420p' if alpha else 'yuv420p',
+                temp_path
+            ]
+            try:
+                if not run_ffmpeg(cmd, progress_callback=progress_callback, stop_event=stop_event):
+                    return None
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        self._evict()
+        return path
+
+    def prepare(self, effects: Effects, video_w: int, video_h: int,
+                stop_event: Optional[Event] = None,
+                progress_callback: Optional[Callable[[FFmpegProgress], None]] = None) -> Optional[EffectSpec]:
+        """
+        Подменяет видео фона и watermark готовыми слоями.
+
+        Результат нужно передавать в построитель фильтров с prerendered=True.
+        Возвращает None, если рендер был остановлен.
+        """
+        spec = as_spec(effects)
+        if not spec.inputs:
+            return spec
+        changes = {}
+        if spec.background_video:
+            changes['background_video'] = self.render(
+                spec.background_video, background_chain(spec, video_w, video_h),
+                stop_event=stop_event, progress_callback=progress_callback)
+        if spec.watermark_video:
+            changes['watermark_video'] = self.render(
+                spec.watermark_video, watermark_chain(video_w, video_h), alpha=True,
+                stop_event=stop_event, progress_callback=progress_callback)
+        if not all(changes.values()):
+            return None
+        return replace(spec, **changes)
+
+    def _evict(self) -> None:
+        """Удаляет давно не использованные слои, пока кэш больше max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.mkv') or name.endswith('.tmp.mkv'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+
+class PrerenderedFFmpegProcessor(FFmpegProcessor):
+    """Поток обработки с эффектами, который сначала готовит слои фона и watermark."""
+
+    def __init__(self, input_path: str, output_path: str, effects: Effects,
+                 video_w: int, video_h: int, intermediates: IntermediateCache):
+        super().__init__([], output_path, parse_progress=True)
+        self.input_path = input_path
+        self.effects = effects
+        self.video_w = video_w
+        self.video_h = video_h
+        self.intermediates = intermediates
+
+    def run(self) -> None:
+        """Готовит слои (или берет их из кэша) и запускает обработку."""
+        try:
+            spec = self.intermediates.prepare(
+                self.effects, self.video_w, self.video_h,
+                stop_event=self.stop_event, progress_callback=self._report_progress,
+            )
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        if spec is None:
+            return
+        self.cmd = build_effects_command(self.input_path, self.output_path, spec,
+                                         self.video_w, self.video_h, prerendered=True)
+        super().run()
@@ -0,0 +1,105 @@
+"""
+Индекс ключевых кадров для быстрого перехода по видео.
+
+Позиции ключевых кадров читаются один раз по флагам пакетов ffprobe (без
+декодирования) и кэшируются. По индексу превью выбирает позиции, для которых
+ffmpeg декодирует не больше нескольких кадров после ключевого.
+"""
+import bisect
+import subprocess
+from dataclasses import dataclass
+from typing import Tuple
+
+from vidify.core.file_cache import LRUCache, stat_key
+from vidify.core.probe import ProbeError
+
+
+# Максимальное количество файлов в кэше
+MAX_CACHED_FILES = 64
+# Сколько секунд видео после ключевого кадра допустимо декодировать ради точной позиции
+MAX_DECODE_SECONDS = 1.0
+
+
+def parse_timestamp(value: str) -> float:
+    """Разбирает время вида 'ЧЧ:ММ:СС.мс' или число секунд."""
+    seconds = 0.0
+    for part in str(value).split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    """Форматирует время в вид 'ЧЧ:ММ:СС.ммм', который понимает ffmpeg."""
+    seconds = max(0.0, seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+@dataclass(frozen=True)
+class KeyframeIndex:
+    """Отсортированные времена ключевых кадров видеопотока в секундах."""
+    times: Tuple[float, ...]
+
+    def previous(self, seconds: float) -> float:
+        """Последний ключевой кадр не позже указанного времени."""
+        position = bisect.bisect_right(self.times, seconds)
+        return self.times[position - 1] if position else 0.0
+
+    def seek_position(self, seconds: float, max_decode: float = MAX_DECODE_SECONDS) -> float:
+        """
+        Позиция для превью: само время, если до него недалеко от ключевого кадра,
+        иначе предыдущий ключевой кадр (декодирование остается ограниченным).
+        """
+        if not self.times:
+            return seconds
+        keyframe = self.previous(seconds)
+        return seconds if seconds - keyframe <= max_decode else keyframe
+
+
+_cache = LRUCache(MAX_CACHED_FILES)
+
+
+def keyframe_index(path: str) -> KeyframeIndex:
+    """
+    Возвращает индекс ключевых кадров файла (из кэша, если файл не менялся).
+
+    Время кадров отсчитывается от начала файла (start_time контейнера), как
+    позиция -ss у ffmpeg, а не от нуля временных меток потока.
+    """
+    try:
+        key = stat_key(path)
+    except OSError as e:
+        raise ProbeError(f"Файл недоступен: {e}")
+    index = _cache.get(key)
+    if index is not None:
+        return index
+
+    # Строки пакетов содержат "pts_time,flags", строка раздела format — только start_time
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags:format=start_time', '-of', 'csv=p=0', path
+    ]
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.PIPE).decode('utf-8', errors='replace')
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode('utf-8', errors='replace').strip() if e.stderr else ''
+        raise ProbeError(f"ffprobe завершился с ошибкой: {stderr or e}")
+    except OSError as e:
+        raise ProbeError(f"Не удалось выполнить ffprobe: {e}")
+
+    times = set()
+    start_time = 0.0
+    for line in output.splitlines():
+        pts_time, separator, flags = line.partition(',')
+        try:
+            if not separator:
+                start_time = float(pts_time)
+            elif 'K' in flags:
+                times.add(float(pts_time))
+        except ValueError:
+            continue
+    index = KeyframeIndex(tuple(sorted(max(0.0, time - start_time) for time in times)))
+
+    _cache.put(key, index)
+    return index
@@ -0,0 +1,102 @@
+"""
+Дисковый кэш информации о видео (название, автор, миниатюра, ID).
+
+Информация хранится в SQLite по нормализованной ссылке, поэтому повторная
+вставка той же ссылки или повторный запуск манифеста не обращаются к сети.
+Записи устаревают через ttl секунд, а при превышении max_entries удаляются
+давно не использованные.
+"""
+import json
+import sqlite3
+import threading
+import time
+import urllib.parse
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+
+# Время жизни записи по умолчанию (неделя)
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+# Максимальное количество записей по умолчанию
+DEFAULT_MAX_ENTRIES = 10000
+# Параметры ссылок, которые не влияют на видео
+_IGNORED_QUERY_PARAMS = {'si', 'feature', 'fbclid', 'gclid'}
+
+
+def normalize_url(url: str, video_id: Optional[str] = None) -> str:
+    """
+    Ключ кэша для ссылки.
+
+    Для YouTube ключом служит ID видео (разные формы ссылки дают один ключ),
+    для остальных — ссылка без фрагмента и служебных параметров, с
+    отсортированными параметрами запроса.
+    """
+    if video_id:
+        return f"youtube:{video_id}"
+    parts = urllib.parse.urlsplit(url.strip())
+    query = sorted(
+        (key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if key not in _IGNORED_QUERY_PARAMS and not key.startswith('utm_')
+    )
+    netloc = parts.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return urllib.parse.urlunsplit((parts.scheme.lower(), netloc, parts.path.rstrip('/'),
+                                    urllib.parse.urlencode(query), ''))
+
+
+class MetadataCache:
+    """Кэш информации о видео в файле SQLite (одно соединение, доступ под блокировкой)."""
+
+    def __init__(self, path: Union[str, Path], ttl: float = DEFAULT_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                "key TEXT PRIMARY KEY, data TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Возвращает сохраненную информацию или None, если ее нет или она устарела."""
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT data, created FROM metadata WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE metadata SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, info: Dict[str, Any]) -> None:
+        """Сохраняет информацию и удаляет устаревшие и лишние записи."""
+        now = time.time()
+        data = json.dumps(info, ensure_ascii=False)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata (key, data, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, now, now)
+            )
+            self._db.execute("DELETE FROM metadata WHERE created < ?", (now - self.ttl,))
+            self._db.execute(
+                "DELETE FROM metadata WHERE key IN "
+                "(SELECT key FROM metadata ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self) -> None:
+        """Удаляет все записи."""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM metadata")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
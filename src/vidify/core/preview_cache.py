@@ -0,0 +1,176 @@
+"""
+LRU-кэш готовых превью в памяти и на диске.
+
+Чтение с диска (load) и запись на диск (save) выполняются отдельными вызовами,
+чтобы декодирование и кодирование PNG можно было вынести из потока интерфейса.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from PyQt5.QtGui import QImage
+
+
+# Ограничения размера кэша по умолчанию
+DEFAULT_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+
+
+def _file_signature(path: str) -> str:
+    """Путь и время изменения файла (изменение файла делает записи кэша недействительными)."""
+    try:
+        return f"{os.path.abspath(path)}@{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return os.path.abspath(path)
+
+
+def make_preview_key(input_path: str, frame_time: str, filter_str: Optional[str],
+                     extra_inputs: Iterable[str] = ()) -> str:
+    """
+    Формирует ключ превью: исходный файл с временем изменения, время кадра
+    и строка фильтра. Видео фона и watermark тоже входят в ключ, так как
+    их пути не попадают в строку фильтра.
+    """
+    parts = [_file_signature(input_path), frame_time, filter_str or '']
+    parts.extend(_file_signature(path) for path in extra_inputs)
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class PreviewCache:
+    """Кэш превью с вытеснением давно не использованных записей по объему."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MEMORY_BYTES, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = DEFAULT_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, QImage]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self) -> None:
+        """Восстанавливает порядок записей на диске по времени последнего использования."""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.png'):
+                try:
+                    stat = os.stat(os.path.join(self.disk_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def get(self, key: str) -> Optional[QImage]:
+        """Возвращает превью из памяти по ключу или None."""
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+            return image
+
+    def on_disk(self, key: str) -> bool:
+        """Есть ли превью на диске (без чтения файла)."""
+        with self._lock:
+            return bool(self.disk_dir) and key in self._disk
+
+    def load(self, key: str) -> Optional[QImage]:
+        """
+        Читает превью с диска и сохраняет его в памяти. Возвращает None, если его нет.
+
+        Декодирует PNG, поэтому вызывается в фоновом потоке.
+        """
+        with self._lock:
+            if not self.disk_dir or key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+
+        path = self._disk_path(key)
+        image = QImage(path)
+        if image.isNull():
+            with self._lock:
+                self._forget_disk(key)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._put_memory(key, image)
+        return image
+
+    def put(self, key: str, image: QImage) -> None:
+        """Сохраняет превью в памяти."""
+        if image is None or image.isNull():
+            return
+        self._put_memory(key, image)
+
+    def save(self, key: str, image: QImage) -> None:
+        """
+        Сохраняет превью на диск, если задана папка.
+
+        Кодирует PNG, поэтому вызывается в фоновом потоке.
+        """
+        if not self.disk_dir or image is None or image.isNull():
+            return
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+        path = self._disk_path(key)
+        # Пишем во временный файл, чтобы get() в другом потоке не прочитал недописанный PNG
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        if not image.save(temp_path, 'PNG'):
+            return
+        try:
+            os.replace(temp_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def clear(self) -> None:
+        """Очищает кэш в памяти (файлы на диске сохраняются)."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _put_memory(self, key: str, image: QImage) -> None:
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old.byteCount()
+            self._memory[key] = image
+            self._memory_bytes += image.byteCount()
+            while self._memory_bytes > self.max_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.byteCount()
+
+    def _evict_disk(self) -> None:
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key = next(iter(self._disk))
+            self._forget_disk(key)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
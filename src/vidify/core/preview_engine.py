@@ -0,0 +1,224 @@
+"""
+Быстрое превью эффектов без запуска ffmpeg на каждое изменение настроек.
+
+Кадр исходного видео декодируется один раз и хранится в памяти, а обрезка,
+размытие фона, затемнение и отражение применяются к нему средствами QPainter.
+Эффекты с внешними видео (фон, watermark) по-прежнему рендерит ffmpeg.
+"""
+import subprocess
+from collections import OrderedDict
+from threading import Event
+from typing import Callable, List, Optional
+
+from PyQt5.QtCore import QThread, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPainter
+
+from vidify.core.effects import Effects, as_spec
+from vidify.core.keyframes import KeyframeIndex, format_timestamp, parse_timestamp
+from vidify.core.video_processor import read_ffmpeg_output
+
+
+# Сколько декодированных кадров держать в памяти
+MAX_CACHED_FRAMES = 8
+
+
+def image_from_rgb24(data: bytes, width: int, height: int,
+                     bytes_per_line: Optional[int] = None) -> QImage:
+    """Создает QImage поверх буфера rgb24 без копирования пикселей (строки без выравнивания, если не задано иное)."""
+    image = QImage(data, width, height, bytes_per_line or width * 3, QImage.Format_RGB888)
+    # QImage не владеет буфером, поэтому держим ссылку на него вместе с изображением
+    image._buffer = data
+    return image
+
+
+def rgb24_output_args(width: int, height: int) -> List[str]:
+    """Параметры вывода кадра заданного размера в формате rgb24 (перед 'pipe:1')."""
+    return ['-s', f"{width}x{height}", '-f', 'rawvideo', '-pix_fmt', 'rgb24']
+
+
+def read_frame(cmd: List[str], width: int, height: int, stop_event: Optional[Event] = None,
+               on_start: Optional[Callable[[subprocess.Popen], None]] = None) -> Optional[QImage]:
+    """
+    Выполняет команду ffmpeg, выводящую кадр rgb24 в stdout, и строит из него QImage.
+
+    Возвращает None, если выполнение было остановлено через stop_event.
+    """
+    data = read_ffmpeg_output(cmd, stop_event=stop_event, on_start=on_start)
+    if data is None:
+        return None
+    expected = width * height * 3
+    if len(data) < expected:
+        raise RuntimeError("ffmpeg не вернул кадр превью")
+    return image_from_rgb24(data if len(data) == expected else data[:expected], width, height)
+
+
+def decode_frame(input_path: str, frame_time: str, width: int, height: int,
+                 stop_event: Optional[Event] = None) -> Optional[QImage]:
+    """
+    Декодирует один кадр видео в память (без промежуточного файла).
+
+    Возвращает None, если декодирование было остановлено через stop_event.
+    """
+    cmd = [
+        'ffmpeg', '-v', 'error',
+        '-ss', frame_time, '-i', input_path,
+        '-frames:v', '1',
+        '-vf', f"scale={width}:{height}",
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+    ]
+    return read_frame(cmd, width, height, stop_event=stop_event)
+
+
+def _darken(image: QImage, amount: float) -> QImage:
+    """
+    Повторяет eq=brightness с отрицательным значением.
+
+    eq сдвигает яркость (Y) на постоянную величину, не меняя цвет, что в RGB
+    соответствует одинаковому сдвигу всех каналов. Сдвиг применяется таблицей
+    к байтам кадра rgb24.
+    """
+    offset = int(round(amount * 255))
+    if offset <= 0:
+        return image
+    source = image.convertToFormat(QImage.Format_RGB888)
+    bits = source.constBits()
+    bits.setsize(source.byteCount())
+    table = bytes(max(0, value - offset) for value in range(256))
+    return image_from_rgb24(bytes(bits).translate(table), source.width(), source.height(),
+                            source.bytesPerLine())
+
+
+def _blur(image: QImage, radius: int) -> QImage:
+    """
+    Приближенно повторяет boxblur: уменьшение и обратное увеличение с сглаживанием.
+
+    ffmpeg размывает только яркость (luma_radius), а здесь размываются все
+    каналы, поэтому цвета фона в превью немного мягче, чем в результате.
+    """
+    if radius <= 1:
+        return image
+    w, h = image.width(), image.height()
+    small = image.scaled(max(1, w // radius), max(1, h // radius), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    return small.scaled(w, h, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+
+class PreviewEngine:
+    """Хранит декодированные кадры одного видео и накладывает на них эффекты."""
+
+    def __init__(self, input_path: str, video_w: int, video_h: int):
+        self.input_path = input_path
+        self.video_w = video_w
+        self.video_h = video_h
+        self._frames: "OrderedDict[str, QImage]" = OrderedDict()
+        self.keyframes: Optional[KeyframeIndex] = None  # Заполняется в фоне после выбора файла
+
+    @staticmethod
+    def can_render(effects: Effects) -> bool:
+        """Можно ли построить превью без ffmpeg (нет внешних видео)."""
+        return not as_spec(effects).inputs
+
+    def seek_time(self, frame_time: str) -> str:
+        """Позиция кадра, для которой ffmpeg декодирует ограниченное число кадров после ключевого."""
+        if not self.keyframes:
+            return frame_time
+        return format_timestamp(self.keyframes.seek_position(parse_timestamp(frame_time)))
+
+    def cached_frame(self, frame_time: str) -> Optional[QImage]:
+        """Возвращает уже декодированный кадр или None."""
+        frame = self._frames.get(frame_time)
+        if frame is not None:
+            self._frames.move_to_end(frame_time)
+        return frame
+
+    def store_frame(self, frame_time: str, frame: QImage) -> None:
+        """Сохраняет кадр в памяти, вытесняя самые старые."""
+        self._frames[frame_time] = frame
+        self._frames.move_to_end(frame_time)
+        while len(self._frames) > MAX_CACHED_FRAMES:
+            self._frames.popitem(last=False)
+
+    def render(self, frame: QImage, effects: Effects) -> QImage:
+        """Применяет эффекты к декодированному кадру."""
+        spec = as_spec(effects)
+        image = frame
+        if spec.flip:
+            image = image.mirrored(True, False)
+        if spec.brightness > 0:
+            image = _darken(image, spec.brightness / 400.0)
+        if not spec.frame:
+            return image
+
+        w, h = image.width(), image.height()
+        top = min(spec.crop_top, h // 2)
+        bottom = min(spec.crop_bottom, h - top - 1)
+        scale = spec.background_scale / 100.0
+
+        # Фон: увеличенный, размытый и затемненный кадр, обрезанный по центру
+        background = image.scaled(int(w * scale), int(h * scale), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        background = _blur(background, spec.background_blur)
+        background = _darken(background, spec.background_darkness / 100.0 * 0.7)
+
+        result = QImage(w, h, QImage.Format_RGB32)
+        painter = QPainter(result)
+        painter.drawImage((w - background.width()) // 2, (h - background.height()) // 2, background)
+        # Передний план: кадр без обрезанных полос на своем месте
+        painter.drawImage(0, top, image.copy(0, top, w, h - top - bottom))
+        painter.end()
+        return result
+
+
+class PreviewFrameLoader(QThread):
+    """Поток декодирования кадра для PreviewEngine."""
+    frame_ready = pyqtSignal(str, object)  # frame_time, QImage
+    error = pyqtSignal(str)
+
+    def __init__(self, engine: PreviewEngine, frame_time: str):
+        super().__init__()
+        self.engine = engine
+        self.frame_time = frame_time
+        self.stop_event = Event()
+
+    def run(self) -> None:
+        """Декодирует кадр."""
+        try:
+            frame = decode_frame(self.engine.input_path, self.frame_time, self.engine.video_w, self.engine.video_h,
+                                 stop_event=self.stop_event)
+            if frame is not None:
+                self.frame_ready.emit(self.frame_time, frame)
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def stop(self) -> None:
+        """Останавливает декодирование."""
+        self.stop_event.set()
+
+
+class PreviewRenderer(QThread):
+    """Поток построения превью с помощью ffmpeg (эффекты с внешними видео)."""
+    finished = pyqtSignal(object)  # QImage
+    error = pyqtSignal(str)
+
+    def __init__(self, cmd: List[str], width: int, height: int):
+        super().__init__()
+        self.cmd = cmd
+        self.width = width
+        self.height = height
+        self.process = None
+        self.stop_event = Event()
+
+    def run(self) -> None:
+        """Запускает ffmpeg и читает кадр из stdout."""
+        try:
+            image = read_frame(self.cmd, self.width, self.height,
+                               stop_event=self.stop_event, on_start=self._set_process)
+            if image is not None:
+                self.finished.emit(image)
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def _set_process(self, process: subprocess.Popen) -> None:
+        self.process = process
+
+    def stop(self) -> None:
+        """Останавливает построение превью."""
+        self.stop_event.set()
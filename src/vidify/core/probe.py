@@ -0,0 +1,153 @@
+"""
+Получение информации о медиафайлах через ffprobe.
+
+Для каждого файла выполняется один вызов ffprobe, результат разбирается в
+MediaInfo и кэшируется по пути, размеру и времени изменения файла, так что
+экраны и обработчики видео не запускают ffprobe повторно.
+"""
+import json
+import subprocess
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from vidify.core.file_cache import LRUCache, stat_key
+
+
+# Максимальное количество файлов в кэше
+MAX_CACHED_FILES = 256
+
+
+class ProbeError(Exception):
+    """Не удалось получить информацию о файле."""
+
+
+def _to_int(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _parse_rate(value: Optional[str]) -> float:
+    """Разбирает частоту кадров вида '30000/1001'."""
+    if not value:
+        return 0.0
+    num, _, den = value.partition('/')
+    try:
+        den_value = float(den) if den else 1.0
+        return float(num) / den_value if den_value else 0.0
+    except ValueError:
+        return 0.0
+
+
+@dataclass(frozen=True)
+class StreamInfo:
+    """Информация о потоке медиафайла."""
+    index: int
+    codec_type: str
+    codec_name: str
+    width: int = 0
+    height: int = 0
+    pix_fmt: str = ''
+    frame_rate: float = 0.0
+    nb_frames: int = 0
+    bit_rate: int = 0
+    duration: float = 0.0
+    sample_rate: int = 0
+    channels: int = 0
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict[str, Any]) -> 'StreamInfo':
+        return cls(
+            index=_to_int(data.get('index')),
+            codec_type=data.get('codec_type', ''),
+            codec_name=data.get('codec_name', ''),
+            width=_to_int(data.get('width')),
+            height=_to_int(data.get('height')),
+            pix_fmt=data.get('pix_fmt', ''),
+            frame_rate=_parse_rate(data.get('avg_frame_rate')) or _parse_rate(data.get('r_frame_rate')),
+            nb_frames=_to_int(data.get('nb_frames')),
+            bit_rate=_to_int(data.get('bit_rate')),
+            duration=_to_float(data.get('duration')),
+            sample_rate=_to_int(data.get('sample_rate')),
+            channels=_to_int(data.get('channels')),
+        )
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """Информация о медиафайле."""
+    path: str
+    format_name: str
+    duration: float
+    size: int
+    bit_rate: int
+    streams: Tuple[StreamInfo, ...]
+
+    @classmethod
+    def from_ffprobe(cls, path: str, data: Dict[str, Any]) -> 'MediaInfo':
+        fmt = data.get('format', {})
+        return cls(
+            path=path,
+            format_name=fmt.get('format_name', ''),
+            duration=_to_float(fmt.get('duration')),
+            size=_to_int(fmt.get('size')),
+            bit_rate=_to_int(fmt.get('bit_rate')),
+            streams=tuple(StreamInfo.from_ffprobe(stream) for stream in data.get('streams', [])),
+        )
+
+    @property
+    def video(self) -> Optional[StreamInfo]:
+        """Первый видеопоток."""
+        return next((s for s in self.streams if s.codec_type == 'video'), None)
+
+    @property
+    def audio(self) -> Optional[StreamInfo]:
+        """Первый аудиопоток."""
+        return next((s for s in self.streams if s.codec_type == 'audio'), None)
+
+    @property
+    def width(self) -> int:
+        return self.video.width if self.video else 0
+
+    @property
+    def height(self) -> int:
+        return self.video.height if self.video else 0
+
+    @property
+    def frame_rate(self) -> float:
+        return self.video.frame_rate if self.video else 0.0
+
+
+_cache = LRUCache(MAX_CACHED_FILES)
+
+
+def probe(path: str) -> MediaInfo:
+    """Возвращает информацию о файле (из кэша, если файл не менялся)."""
+    try:
+        key = stat_key(path)
+    except OSError as e:
+        raise ProbeError(f"Файл недоступен: {e}")
+    info = _cache.get(key)
+    if info is not None:
+        return info
+
+    cmd = ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', path]
+    try:
+        output = subprocess.check_output(cmd, stderr=subprocess.PIPE)
+        info = MediaInfo.from_ffprobe(path, json.loads(output.decode('utf-8')))
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode('utf-8', errors='replace').strip() if e.stderr else ''
+        raise ProbeError(f"ffprobe завершился с ошибкой: {stderr or e}")
+    except (OSError, ValueError) as e:
+        raise ProbeError(f"Не удалось выполнить ffprobe: {e}")
+
+    _cache.put(key, info)
+    return info
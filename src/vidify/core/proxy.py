@@ -0,0 +1,107 @@
+"""
+Прокси-копии видео низкого разрешения для интерактивного редактирования.
+
+Превью строится по небольшой копии из одних ключевых кадров: переход к любому
+кадру не требует декодирования предыдущих, а размытие и наложение работают с
+кадром 540p независимо от разрешения исходника. Итоговая обработка всегда
+использует оригинал.
+"""
+import hashlib
+import os
+import threading
+from dataclasses import replace
+from threading import Event
+from typing import Optional, Tuple
+
+from vidify.core.effects import Effects, EffectSpec, as_spec
+from vidify.core.video_processor import run_ffmpeg
+
+
+# Высота прокси-копии
+PROXY_HEIGHT = 540
+# Для видео не выше этого порога прокси не создается: выигрыш был бы небольшим
+MIN_PROXY_SOURCE_HEIGHT = 900
+# Сколько прокси-копий хранить в папке кэша
+MAX_PROXIES = 5
+
+
+def needs_proxy(video_h: int) -> bool:
+    """Нужна ли прокси-копия для видео указанной высоты."""
+    return video_h > MIN_PROXY_SOURCE_HEIGHT
+
+
+def proxy_size(video_w: int, video_h: int, height: int = PROXY_HEIGHT) -> Tuple[int, int]:
+    """Размеры прокси-копии с сохранением пропорций (четные, как требует yuv420p)."""
+    width = max(2, int(round(video_w * height / video_h / 2)) * 2)
+    return width, height
+
+
+def scale_spec(effects: Effects, factor: float) -> EffectSpec:
+    """Пересчитывает параметры в пикселях (обрезка, размытие) для видео другого размера."""
+    spec = as_spec(effects)
+    if factor == 1:
+        return spec
+    return replace(
+        spec,
+        crop_top=int(round(spec.crop_top * factor)),
+        crop_bottom=int(round(spec.crop_bottom * factor)),
+        background_blur=max(1, int(round(spec.background_blur * factor))) if spec.background_blur else 0,
+    )
+
+
+def _proxy_path(cache_dir: str, input_path: str, height: int) -> str:
+    stat = os.stat(input_path)
+    signature = f"{os.path.abspath(input_path)}@{stat.st_size}@{stat.st_mtime_ns}@{height}"
+    return os.path.join(cache_dir, f"{hashlib.sha1(signature.encode('utf-8')).hexdigest()}.mp4")
+
+
+def _evict(cache_dir: str) -> None:
+    """Оставляет только MAX_PROXIES последних использованных копий."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.mp4') and not name.endswith('.tmp.mp4'):
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+    for _, path in sorted(entries, reverse=True)[MAX_PROXIES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def create_proxy(input_path: str, video_w: int, video_h: int, cache_dir: str,
+                 height: int = PROXY_HEIGHT, stop_event: Optional[Event] = None) -> Optional[str]:
+    """
+    Создает прокси-копию (или берет готовую из cache_dir) и возвращает путь к ней.
+
+    Возвращает None, если создание было остановлено через stop_event.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _proxy_path(cache_dir, input_path, height)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    width, height = proxy_size(video_w, video_h, height)
+    # Свое временное имя для каждого запуска: одну копию могут одновременно создавать
+    # несколько потоков или окон приложения
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.mp4"
+    cmd = [
+        'ffmpeg', '-y', '-i', input_path,
+        '-vf', f"scale={width}:{height}", '-an',
+        # Только ключевые кадры: любой кадр декодируется без предыдущих
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'fastdecode', '-crf', '20', '-g', '1',
+        '-pix_fmt', 'yuv420p',
+        temp_path
+    ]
+    try:
+        if not run_ffmpeg(cmd, stop_event=stop_event):
+            return None
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    _evict(cache_dir)
+    return path
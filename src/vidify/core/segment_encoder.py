@@ -0,0 +1,231 @@
+"""
+Параллельная уникализация длинных видео по частям.
+
+Видео режется по ключевым кадрам без перекодирования, части обрабатываются
+одновременно несколькими процессами ffmpeg, затем склеиваются concat-демультиплексором,
+а аудио копируется из исходного файла.
+"""
+import csv
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from typing import Callable, List, Optional, Tuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from vidify.core.effects import Effects, build_effects_command
+from vidify.core.intermediates import IntermediateCache
+from vidify.core.probe import ProbeError, probe
+from vidify.core.video_processor import FFmpegError, FFmpegProgress, run_ffmpeg
+
+
+# Длительность одной части в секундах
+DEFAULT_SEGMENT_SECONDS = 60
+# Видео короче этого порога обрабатываются одним процессом
+MIN_SEGMENTED_DURATION = 180
+# Минимальное количество ядер, при котором есть смысл делить видео
+MIN_SEGMENTED_CPUS = 4
+
+
+def should_encode_segmented(input_path: str, duration: Optional[float] = None) -> bool:
+    """Проверяет, выгодно ли обрабатывать видео по частям."""
+    if (os.cpu_count() or 1) < MIN_SEGMENTED_CPUS:
+        return False
+    if duration is None:
+        try:
+            duration = probe(input_path).duration
+        except ProbeError:
+            return False
+    return duration >= MIN_SEGMENTED_DURATION
+
+
+def split_at_keyframes(input_path: str, work_dir: str,
+                       segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                       stop_event: Optional[Event] = None) -> List[Tuple[str, float, float]]:
+    """
+    Режет видеодорожку на части по ключевым кадрам без перекодирования.
+
+    Возвращает список (путь, начало, конец) в секундах.
+    """
+    ext = os.path.splitext(input_path)[1] or '.mkv'
+    list_path = os.path.join(work_dir, 'segments.csv')
+    cmd = [
+        'ffmpeg', '-y', '-i', input_path,
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment', '-segment_time', str(segment_seconds),
+        '-reset_timestamps', '1',
+        '-segment_list', list_path, '-segment_list_type', 'csv',
+        os.path.join(work_dir, f"src%04d{ext}")
+    ]
+    if not run_ffmpeg(cmd, stop_event=stop_event):
+        return []
+
+    segments = []
+    with open(list_path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) >= 3:
+                segments.append((os.path.join(work_dir, row[0]), float(row[1]), float(row[2])))
+    return segments
+
+
+def concat_segments(segment_paths: List[str], audio_source: str, output_path: str,
+                    work_dir: str, stop_event: Optional[Event] = None) -> bool:
+    """Склеивает обработанные части и добавляет аудио из исходного файла."""
+    list_path = os.path.join(work_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = [
+        'ffmpeg', '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', audio_source,
+        '-map', '0:v', '-map', '1:a?',
+        '-c', 'copy',
+        output_path
+    ]
+    return run_ffmpeg(cmd, stop_event=stop_event)
+
+
+def encode_segmented(input_path: str, output_path: str, effects: Effects,
+                     video_w: int, video_h: int, workers: Optional[int] = None,
+                     segment_seconds: float = DEFAULT_SEGMENT_SECONDS,
+                     progress_callback: Optional[Callable[[FFmpegProgress], None]] = None,
+                     stop_event: Optional[Event] = None,
+                     temp_dir: Optional[str] = None,
+                     intermediates: Optional[IntermediateCache] = None) -> bool:
+    """
+    Применяет эффекты к видео, обрабатывая части параллельно.
+
+    Если задан intermediates, видео фона и watermark обрабатываются один раз
+    для всех частей, а не в каждой части заново.
+
+    Прогресс суммируется по всем частям с учетом их длительности.
+    Возвращает False, если обработка была остановлена через stop_event.
+    """
+    stop_event = stop_event or Event()
+    if intermediates:
+        effects = intermediates.prepare(effects, video_w, video_h, stop_event)
+        if effects is None:
+            return False
+    cpus = os.cpu_count() or 1
+    work_dir = tempfile.mkdtemp(prefix='vidify_segments_', dir=temp_dir)
+    try:
+        segments = split_at_keyframes(input_path, work_dir, segment_seconds, stop_event)
+        if stop_event.is_set():
+            return False
+        if not segments:
+            raise FFmpegError("Не удалось разделить видео на части")
+
+        workers = max(1, min(workers or cpus, len(segments)))
+        # Делим ядра между процессами, чтобы экземпляры кодировщика не конкурировали за потоки
+        threads = max(1, cpus // workers)
+        ext = os.path.splitext(output_path)[1] or '.mp4'
+
+        durations = [max(end - start, 0.001) for _, start, end in segments]
+        total_duration = sum(durations)
+        done = [0.0] * len(segments)
+        fps = [0.0] * len(segments)
+        lock = threading.Lock()
+        started = time.monotonic()
+        last_reported = [-1]
+
+        def report(index: int, progress: FFmpegProgress) -> None:
+            if progress_callback is None:
+                return
+            with lock:
+                done[index] = min(progress.out_time, durations[index])
+                fps[index] = progress.fps
+                processed = sum(done)
+                # Последние проценты оставляем на склейку
+                percent = min(int(processed * 100 / total_duration), 99)
+                if percent == last_reported[0]:
+                    return
+                last_reported[0] = percent
+                # Скорость считаем по всем частям вместе: обработанное время видео к прошедшему времени
+                speed = processed / max(time.monotonic() - started, 0.001)
+                eta = (total_duration - processed) / speed if speed > 0 else None
+                progress_callback(FFmpegProgress(percent=percent, out_time=processed, duration=total_duration,
+                                                 fps=sum(fps), speed=speed, eta=eta))
+
+        def encode(index: int) -> str:
+            if stop_event.is_set():
+                return ''
+            segment_path, start, _ = segments[index]
+            out_path = os.path.join(work_dir, f"out{index:04d}{ext}")
+            cmd = build_effects_command(segment_path, out_path, effects, video_w, video_h,
+                                        aux_offset=start, audio=False,
+                                        extra_args=['-threads', str(threads)],
+                                        prerendered=intermediates is not None)
+            callback = (lambda progress: report(index, progress)) if progress_callback else None
+            completed = run_ffmpeg(cmd, progress_callback=callback, stop_event=stop_event,
+                                   duration=durations[index])
+            return out_path if completed else ''
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(encode, i) for i in range(len(segments))]
+            try:
+                outputs = [future.result() for future in futures]
+            except Exception:
+                # Останавливаем остальные части при первой ошибке
+                stop_event.set()
+                raise
+
+        if stop_event.is_set() or not all(outputs):
+            return False
+
+        completed = concat_segments(outputs, input_path, output_path, work_dir, stop_event)
+        if completed and progress_callback:
+            progress_callback(FFmpegProgress(percent=100, out_time=total_duration,
+                                             duration=total_duration, eta=0.0))
+        return completed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class SegmentedFFmpegProcessor(QThread):
+    """Поток параллельной уникализации по частям с интерфейсом FFmpegProcessor."""
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    progress_info = pyqtSignal(object)  # FFmpegProgress
+
+    def __init__(self, input_path: str, output_path: str, effects: Effects,
+                 video_w: int, video_h: int, workers: Optional[int] = None,
+                 temp_dir: Optional[str] = None, intermediates: Optional[IntermediateCache] = None):
+        super().__init__()
+        self.input_path = input_path
+        self.output_path = output_path
+        self.effects = effects
+        self.video_w = video_w
+        self.video_h = video_h
+        self.workers = workers
+        self.temp_dir = temp_dir
+        self.intermediates = intermediates
+        self.stop_event = Event()
+
+    def run(self) -> None:
+        """Запускает обработку."""
+        try:
+            completed = encode_segmented(
+                self.input_path, self.output_path, self.effects, self.video_w, self.video_h,
+                workers=self.workers, progress_callback=self._report_progress,
+                stop_event=self.stop_event, temp_dir=self.temp_dir,
+                intermediates=self.intermediates,
+            )
+            if completed:
+                self.finished.emit(self.output_path)
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def _report_progress(self, progress: FFmpegProgress) -> None:
+        self.progress.emit(progress.percent)
+        self.progress_info.emit(progress)
+
+    def stop(self) -> None:
+        """Останавливает обработку всех частей."""
+        self.stop_event.set()
@@ -0,0 +1,98 @@
+"""
+Выполнение коротких фоновых задач (ffprobe, извлечение кадров) в пуле потоков.
+
+Результаты возвращаются в поток интерфейса через сигналы. Задачи, запущенные
+до вызова cancel(), считаются устаревшими: если они еще не начались, то не
+выполняются, а их результаты отбрасываются.
+
+По умолчанию используется общий пул Qt. Долгим задачам (прокси-копии, лента
+миниатюр) лучше передать отдельный пул (см. long_running_pool), чтобы они не
+занимали потоки, нужные коротким.
+"""
+from typing import Any, Callable, Optional, Set
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+# Сколько долгих задач выполняется одновременно
+LONG_RUNNING_THREADS = 2
+
+
+def long_running_pool(parent: Optional[QObject] = None,
+                      max_threads: int = LONG_RUNNING_THREADS) -> QThreadPool:
+    """Отдельный пул для долгих задач с ограниченным числом потоков."""
+    pool = QThreadPool(parent)
+    pool.setMaxThreadCount(max_threads)
+    return pool
+
+
+class _TaskSignals(QObject):
+    """Сигналы одной задачи (QRunnable не может сам испускать сигналы)."""
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    skipped = pyqtSignal()  # Задача устарела до начала выполнения
+
+
+class _Task(QRunnable):
+    """Задача пула, вызывающая функцию с аргументами."""
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, is_stale: Callable[[], bool]):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.is_stale = is_stale
+        self.signals = _TaskSignals()
+
+    def run(self) -> None:
+        if self.is_stale():
+            self.signals.skipped.emit()
+            return
+        try:
+            result = self.fn(*self.args)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+
+class TaskRunner(QObject):
+    """Запускает функции в пуле потоков и доставляет только актуальные результаты."""
+
+    def __init__(self, pool: Optional[QThreadPool] = None, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._pool = pool or QThreadPool.globalInstance()
+        self._generation = 0
+        # Ссылки на задачи, чтобы сигналы не удалились до доставки результата
+        self._tasks: Set[_Task] = set()
+
+    def submit(self, fn: Callable[..., Any], *args: Any,
+               on_result: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[str], None]] = None) -> None:
+        """Ставит функцию в очередь пула; обработчики вызываются в потоке интерфейса."""
+        generation = self._generation
+        task = _Task(fn, args, lambda: generation != self._generation)
+        task.setAutoDelete(False)
+
+        def finish(result: Any) -> None:
+            self._tasks.discard(task)
+            if generation == self._generation and on_result:
+                on_result(result)
+
+        def fail(message: str) -> None:
+            self._tasks.discard(task)
+            if generation == self._generation and on_error:
+                on_error(message)
+
+        task.signals.finished.connect(finish)
+        task.signals.error.connect(fail)
+        task.signals.skipped.connect(lambda: self._tasks.discard(task))
+        self._tasks.add(task)
+        self._pool.start(task)
+
+    def cancel(self) -> None:
+        """Делает устаревшими все ранее запущенные задачи."""
+        self._generation += 1
+        # Задачи, которые еще не начались, убираем из очереди пула
+        for task in list(self._tasks):
+            if self._pool.tryTake(task):
+                self._tasks.discard(task)
@@ -0,0 +1,151 @@
+"""
+Кэш миниатюр видео.
+
+Скачанные миниатюры хранятся на диске под именем по SHA-256 содержимого
+(одинаковые изображения с разных адресов занимают место один раз), а ссылка
+указывает на содержимое через небольшой файл в папке refs. Уменьшенные до
+размера показа изображения дополнительно держатся в памяти. Декодирование и
+масштабирование выполняются в потоке загрузки: QImage, в отличие от QPixmap,
+можно использовать вне потока интерфейса.
+"""
+import hashlib
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+
+# Ограничение размера кэша на диске по умолчанию
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# Сколько уменьшенных миниатюр держать в памяти
+MAX_MEMORY_IMAGES = 64
+# Время ожидания ответа сервера миниатюр
+DOWNLOAD_TIMEOUT = 3
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ThumbnailCache:
+    """Миниатюры на диске (по хэшу содержимого) и уменьшенные копии в памяти."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_BYTES,
+                 max_images: int = MAX_MEMORY_IMAGES):
+        self.cache_dir = cache_dir
+        self.refs_dir = os.path.join(cache_dir, 'refs')
+        self.max_bytes = max_bytes
+        self.max_images = max_images
+        os.makedirs(self.refs_dir, exist_ok=True)
+        self._images: "OrderedDict[Tuple[str, int, int], QImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ref_path(self, url: str) -> str:
+        return os.path.join(self.refs_dir, _sha256(url.encode('utf-8')))
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, f"{digest}.img")
+
+    def read(self, url: str) -> Optional[bytes]:
+        """Возвращает сохраненное содержимое миниатюры или None."""
+        try:
+            with open(self._ref_path(url), encoding='ascii') as f:
+                blob_path = self._blob_path(f.read().strip())
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+            os.utime(blob_path)
+            return data
+        except (OSError, ValueError):
+            return None
+
+    def write(self, url: str, data: bytes) -> None:
+        """Сохраняет содержимое миниатюры на диск."""
+        digest = _sha256(data)
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            temp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, blob_path)
+        ref_path = self._ref_path(url)
+        temp_path = f"{ref_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='ascii') as f:
+            f.write(digest)
+        os.replace(temp_path, ref_path)
+        self._evict()
+
+    def load(self, url: str, width: int, height: int) -> QImage:
+        """
+        Возвращает миниатюру, уменьшенную до размеров width x height с сохранением пропорций.
+
+        Скачивает изображение, только если его нет в кэше. Возвращает пустой
+        QImage, если изображение не удалось декодировать.
+        """
+        key = (url, width, height)
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                return image
+
+        data = self.read(url)
+        downloaded = data is None
+        if downloaded:
+            request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+            with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+                data = response.read()
+        image = QImage.fromData(data)
+        if image.isNull():
+            return image
+        if downloaded:
+            try:
+                self.write(url, data)
+            except OSError:
+                # Без записи на диск миниатюра все равно показывается
+                pass
+
+        if image.width() > width or image.height() > height:
+            image = image.scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        with self._lock:
+            self._images[key] = image
+            while len(self._images) > self.max_images:
+                self._images.popitem(last=False)
+        return image
+
+    def _evict(self) -> None:
+        """Удаляет давно не использованные миниатюры, пока кэш больше max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.img'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        removed = set()
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+                removed.add(name[:-len('.img')])
+            except OSError:
+                pass
+        if not removed:
+            return
+        # Удаляем и ссылки на удаленные изображения
+        for name in os.listdir(self.refs_dir):
+            path = os.path.join(self.refs_dir, name)
+            try:
+                with open(path, encoding='ascii') as f:
+                    if f.read().strip() in removed:
+                        os.remove(path)
+            except (OSError, ValueError):
+                continue
@@ -0,0 +1,184 @@
+"""
+Уникализация нескольких вариантов одного видео за один запуск ffmpeg.
+
+Исходное видео декодируется один раз, поток делится фильтром split на K
+копий, к каждой применяется своя цепочка эффектов, и результат пишется в K
+выходных файлов. Видео фона и watermark, общие для нескольких вариантов,
+тоже декодируются один раз.
+"""
+import random
+from threading import Event
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from vidify.core.effects import Effects, as_spec, build_effects_graph, normalize_effects
+from vidify.core.intermediates import IntermediateCache
+from vidify.core.video_processor import FFmpegProgress, run_ffmpeg
+
+
+# Сколько вариантов кодировать одним процессом ffmpeg (каждый выход держит свой кодировщик)
+DEFAULT_VARIANTS_PER_RUN = 8
+
+# Вариант: путь к выходному файлу и настройки эффектов
+Variant = Tuple[str, Effects]
+
+# Диапазон параметра: (минимум, максимум) для чисел, вероятность включения для флагов
+# или фиксированное значение
+ParamRange = Union[Tuple[int, int], float, bool, int]
+
+# Диапазоны случайных вариантов по умолчанию
+DEFAULT_RANGES: Dict[str, ParamRange] = {
+    'flip': 0.5,
+    'brightness': (0, 40),
+    'crop_top': (40, 160),
+    'crop_bottom': (40, 160),
+    'background_blur': (5, 20),
+    'background_darkness': (30, 70),
+    'background_scale': (110, 150),
+}
+
+# Параметры, которые действуют только вместе с эффектом рамки
+FRAME_PARAMS = ('crop_top', 'crop_bottom', 'background_blur', 'background_darkness', 'background_scale')
+
+
+def _sample_value(rng: random.Random, key: str, value: ParamRange, default: Any) -> Any:
+    """Выбирает значение параметра из диапазона."""
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        return rng.random() < float(value)
+    if isinstance(value, (tuple, list)):
+        low, high = value
+        if low > high:
+            raise ValueError(f"Неверный диапазон параметра {key}: {low} > {high}")
+        return rng.randint(int(low), int(high))
+    return type(default)(value)
+
+
+def sample_variant(seed: Any, index: int, ranges: Optional[Dict[str, ParamRange]] = None,
+                   base: Optional[Dict[str, Any]] = None, video_h: int = 0) -> Dict[str, Any]:
+    """
+    Возвращает настройки эффектов варианта index.
+
+    Генератор каждого варианта инициализируется строкой "seed:index", поэтому
+    любой вариант можно воспроизвести отдельно, не генерируя предыдущие.
+    Если задана высота видео, обрезка ограничивается 49% высоты, как на экране
+    уникализации. Если выбираются параметры рамки, а сам флаг frame в ranges
+    не задан, рамка включается — иначе эти параметры ни на что не влияли бы.
+    """
+    ranges = DEFAULT_RANGES if ranges is None else ranges
+    effects = normalize_effects(base)
+    unknown = set(ranges) - set(effects)
+    if unknown:
+        raise ValueError(f"Неизвестные параметры эффектов: {', '.join(sorted(unknown))}")
+    rng = random.Random(f"{seed}:{index}")
+    # Порядок ключей фиксирован, чтобы результат не зависел от порядка в манифесте
+    for key in sorted(ranges):
+        if key in ('background_video', 'watermark_video'):
+            raise ValueError(f"Параметр {key} нельзя выбирать случайно")
+        effects[key] = _sample_value(rng, key, ranges[key], effects[key])
+    if 'frame' not in ranges and any(key in FRAME_PARAMS for key in ranges):
+        effects['frame'] = True
+    if video_h:
+        max_crop = int(video_h * 0.49)
+        effects['crop_top'] = min(effects['crop_top'], max_crop)
+        effects['crop_bottom'] = min(effects['crop_bottom'], max_crop)
+    return effects
+
+
+def sample_variants(count: int, seed: Any, ranges: Optional[Dict[str, ParamRange]] = None,
+                    base: Optional[Dict[str, Any]] = None, video_h: int = 0) -> List[Dict[str, Any]]:
+    """Возвращает count воспроизводимых наборов эффектов для зерна seed."""
+    return [sample_variant(seed, index, ranges, base, video_h) for index in range(count)]
+
+
+def _split(label: str, names: List[str]) -> str:
+    """Делит поток на несколько копий (для одной копии split не нужен)."""
+    if len(names) == 1:
+        return f"[{label}]null[{names[0]}]"
+    return f"[{label}]split={len(names)}" + "".join(f"[{name}]" for name in names)
+
+
+def build_variants_command(input_path: str, variants: Sequence[Variant], video_w: int, video_h: int,
+                           audio: bool = True, extra_args: Optional[List[str]] = None,
+                           prerendered: bool = False) -> List[str]:
+    """
+    Создает одну команду ffmpeg, которая пишет все варианты сразу.
+
+    extra_args (например, параметры кодировщика) добавляются перед каждым
+    выходным файлом, prerendered — фон и watermark уже обработаны заранее.
+    """
+    if not variants:
+        raise ValueError("Не задано ни одного варианта")
+    specs = [as_spec(effects) for _, effects in variants]
+
+    # Дополнительные входы без повторов и сколько раз каждый используется
+    extra_inputs: List[str] = []
+    uses: Dict[str, List[str]] = {}
+    variant_labels: List[Dict[str, str]] = []
+    for spec in specs:
+        labels = {}
+        if spec.frame:
+            for key in ('background_video', 'watermark_video'):
+                path = getattr(spec, key)
+                if not path:
+                    continue
+                if path not in uses:
+                    extra_inputs.append(path)
+                    uses[path] = []
+                labels[key] = f"x{extra_inputs.index(path) + 1}_{len(uses[path])}"
+                uses[path].append(labels[key])
+        variant_labels.append(labels)
+
+    parts = [_split('0:v', [f"src{i}" for i in range(len(variants))])]
+    for number, path in enumerate(extra_inputs, start=1):
+        parts.append(_split(f"{number}:v", uses[path]))
+    for index, spec in enumerate(specs):
+        labels = variant_labels[index]
+        graph = build_effects_graph(spec, video_w, video_h, source=f"src{index}",
+                                    background=labels.get('background_video'),
+                                    watermark=labels.get('watermark_video'),
+                                    output=f"out{index}", prefix=f"v{index}_", prerendered=prerendered)
+        if graph is None:
+            raise ValueError(f"Вариант {index + 1}: не удалось построить фильтр")
+        parts.append(graph)
+
+    cmd = ['ffmpeg', '-y', '-i', input_path]
+    for path in extra_inputs:
+        cmd.extend(['-i', path])
+    cmd.extend(['-filter_complex', ";".join(parts)])
+    for index, (output_path, _) in enumerate(variants):
+        cmd.extend(['-map', f"[out{index}]"])
+        if audio:
+            cmd.extend(['-map', '0:a?', '-c:a', 'copy'])
+        if extra_args:
+            cmd.extend(extra_args)
+        cmd.append(output_path)
+    return cmd
+
+
+def encode_variants(input_path: str, variants: Sequence[Variant], video_w: int, video_h: int,
+                    progress_callback: Optional[Callable[[FFmpegProgress], None]] = None,
+                    stop_event: Optional[Event] = None,
+                    per_run: int = DEFAULT_VARIANTS_PER_RUN,
+                    intermediates: Optional[IntermediateCache] = None) -> bool:
+    """
+    Создает варианты группами по per_run за один процесс ffmpeg.
+
+    Если задан intermediates, видео фона и watermark заранее обрабатываются
+    и кэшируются. Возвращает False при остановке.
+    """
+    per_run = max(1, per_run)
+    if intermediates:
+        prepared = []
+        for output_path, effects in variants:
+            spec = intermediates.prepare(effects, video_w, video_h, stop_event)
+            if spec is None:
+                return False
+            prepared.append((output_path, spec))
+        variants = prepared
+    for start in range(0, len(variants), per_run):
+        cmd = build_variants_command(input_path, variants[start:start + per_run], video_w, video_h,
+                                     prerendered=intermediates is not None)
+        if not run_ffmpeg(cmd, progress_callback=progress_callback, stop_event=stop_event):
+            return False
+    return True
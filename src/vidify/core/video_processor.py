@@ -1,113 +1,413 @@
 """
 Модуль для обработки видео с помощью FFmpeg.
 """
+import io
 import os
+import signal
 import subprocess
+import threading
 import time
+from collections import deque
+from dataclasses import dataclass, replace
 from threading import Event
-from typing import List, Optional, Tuple
+from typing import Callable, Deque, List, Optional, Tuple
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from vidify.core.probe import MediaInfo, ProbeError, probe
+
+
+# Форматы конвертации без потери качества
+VIDEO_FORMATS = {
+    'mp4': {
+        'extension': 'mp4',
+        'codec': 'libx264',
+        'params': ['-preset', 'slow', '-crf', '0']
+    },
+    'mkv': {
+        'extension': 'mkv',
+        'codec': 'libx264',
+        'params': ['-preset', 'slow', '-crf', '0']
+    },
+    'avi': {
+        'extension': 'avi',
+        'codec': 'huffyuv',
+        'params': []
+    },
+    'mov': {
+        'extension': 'mov',
+        'codec': 'prores_ks',
+        'params': ['-profile:v', '4444']
+    },
+    'webm': {
+        'extension': 'webm',
+        'codec': 'libvpx-vp9',
+        'params': ['-lossless', '1']
+    }
+}
+
+
+# Сколько последних байт stderr хранится для отчета об ошибке
+STDERR_TAIL_BYTES = 64 * 1024
+# Сколько строк с ошибками попадает в краткий отчет
+MAX_ERROR_LINES = 20
+# Размер блока чтения вывода ffmpeg из stdout
+OUTPUT_CHUNK_BYTES = 1024 * 1024
+# Сколько секунд ffmpeg может завершаться после SIGTERM, прежде чем получит SIGKILL
+TERMINATE_GRACE_SECONDS = 2.0
+# Как часто проверяется запрос остановки процесса
+STOP_POLL_SECONDS = 0.05
+# Признаки строк stderr, описывающих причину ошибки
+_ERROR_MARKERS = ('error', 'invalid', 'no such file', 'not found', 'unable', 'failed',
+                  'could not', 'cannot', 'unrecognized', 'unknown encoder', 'unknown decoder')
+
+
+class StderrBuffer:
+    """
+    Кольцевой буфер stderr ограниченного размера.
+
+    Хранит последние max_bytes вывода и отдельно первые строки с ошибками,
+    поэтому память не растет на длинных задачах, а отчет остается полезным.
+    """
+
+    def __init__(self, max_bytes: int = STDERR_TAIL_BYTES, max_errors: int = MAX_ERROR_LINES):
+        self.max_bytes = max_bytes
+        self.max_errors = max_errors
+        self.errors: List[str] = []
+        self.dropped_errors = 0
+        self._lines: Deque[str] = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, line: str) -> None:
+        """Добавляет строку, вытесняя самые старые."""
+        line = line.rstrip('\r\n')
+        if not line:
+            return
+        with self._lock:
+            self._lines.append(line)
+            self._size += len(line) + 1
+            while self._size > self.max_bytes and len(self._lines) > 1:
+                self._size -= len(self._lines.popleft()) + 1
+            lowered = line.lower()
+            if any(marker in lowered for marker in _ERROR_MARKERS) and line not in self.errors:
+                if len(self.errors) < self.max_errors:
+                    self.errors.append(line)
+                else:
+                    self.dropped_errors += 1
+
+    @property
+    def tail(self) -> str:
+        """Последние строки вывода."""
+        with self._lock:
+            return '\n'.join(self._lines)
+
+    def summary(self, fallback_lines: int = 5) -> str:
+        """Строки с ошибками или, если их нет, несколько последних строк вывода."""
+        with self._lock:
+            lines = list(self.errors) or list(self._lines)[-fallback_lines:]
+            if self.dropped_errors:
+                lines.append(f"... и еще {self.dropped_errors} строк с ошибками")
+        return '\n'.join(lines)
+
+
+# Кодеки, которые каждый контейнер принимает без перекодирования
+COPY_VIDEO_CODECS = {
+    'mp4': {'h264', 'hevc', 'av1', 'mpeg4'},
+    'mkv': {'h264', 'hevc', 'av1', 'vp8', 'vp9', 'mpeg4', 'ffv1', 'huffyuv', 'prores'},
+    'avi': {'huffyuv', 'mpeg4', 'mjpeg', 'ffv1'},
+    'mov': {'h264', 'hevc', 'prores', 'mpeg4'},
+    'webm': {'vp8', 'vp9', 'av1'},
+}
+COPY_AUDIO_CODECS = {
+    'mp4': {'aac', 'mp3', 'ac3', 'eac3', 'alac'},
+    'mkv': {'aac', 'mp3', 'ac3', 'eac3', 'alac', 'opus', 'vorbis', 'flac', 'pcm_s16le', 'pcm_s24le'},
+    'avi': {'mp3', 'ac3', 'pcm_s16le'},
+    'mov': {'aac', 'mp3', 'ac3', 'alac', 'pcm_s16le', 'pcm_s24le'},
+    'webm': {'opus', 'vorbis'},
+}
+
+
+class FFmpegError(Exception):
+    """Ошибка выполнения FFmpeg."""
+
+    def __init__(self, message: str, returncode: Optional[int] = None,
+                 summary: str = '', stderr_tail: str = ''):
+        super().__init__(f"{message}\n{summary}" if summary else message)
+        self.returncode = returncode
+        self.summary = summary
+        self.stderr_tail = stderr_tail
+
+
+def _raise_for_exit(exit_code: int, stderr: StderrBuffer) -> None:
+    """Выбрасывает FFmpegError с кратким отчетом по stderr."""
+    raise FFmpegError(f"FFmpeg завершился с ошибкой: код {exit_code}", returncode=exit_code,
+                      summary=stderr.summary(), stderr_tail=stderr.tail)
+
+
+def _input_path(cmd: List[str]) -> str:
+    """Возвращает путь к первому входному файлу команды."""
+    return cmd[cmd.index('-i') + 1]
+
+
+@dataclass
+class FFmpegProgress:
+    """Состояние выполнения команды FFmpeg по данным -progress."""
+    percent: int = 0
+    out_time: float = 0.0            # Обработано секунд видео
+    duration: float = 0.0            # Общая длительность в секундах (0, если неизвестна)
+    frame: int = 0
+    fps: float = 0.0
+    speed: float = 0.0               # Скорость относительно реального времени
+    eta: Optional[float] = None      # Оставшееся время в секундах
+
+    def describe(self) -> str:
+        """Краткое описание для строки статуса."""
+        parts = [f"{self.percent}%"]
+        if self.fps:
+            parts.append(f"{self.fps:.0f} к/с")
+        if self.speed:
+            parts.append(f"{self.speed:.2f}x")
+        if self.eta is not None:
+            minutes, seconds = divmod(int(self.eta), 60)
+            parts.append(f"осталось {minutes}:{seconds:02d}")
+        return ", ".join(parts)
+
+
+def _parse_progress_value(value: str) -> float:
+    """Разбирает число из вывода -progress ('N/A' и '1.5x' допускаются)."""
+    try:
+        return float(value.rstrip('x'))
+    except ValueError:
+        return 0.0
+
+
+def _update_progress(progress: FFmpegProgress, key: str, value: str) -> None:
+    """Применяет одну пару ключ=значение из вывода -progress."""
+    if key in ('out_time_us', 'out_time_ms'):
+        # out_time_ms исторически тоже содержит микросекунды
+        progress.out_time = max(0.0, _parse_progress_value(value) / 1000000)
+    elif key == 'frame':
+        progress.frame = int(_parse_progress_value(value))
+    elif key == 'fps':
+        progress.fps = _parse_progress_value(value)
+    elif key == 'speed':
+        progress.speed = _parse_progress_value(value)
+
+
+def _with_progress_output(cmd: List[str]) -> List[str]:
+    """Добавляет к команде машиночитаемый вывод прогресса в stdout."""
+    return [cmd[0], '-progress', 'pipe:1', '-nostats'] + cmd[1:]
+
+
+def _drain(stream, buffer: StderrBuffer) -> threading.Thread:
+    """Читает поток в отдельном потоке, чтобы ffmpeg не блокировался на заполненном буфере."""
+    def read() -> None:
+        for line in iter(stream.readline, ''):
+            buffer.append(line)
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_process(cmd: List[str], **kwargs) -> subprocess.Popen:
+    """
+    Запускает процесс в отдельной группе процессов.
+
+    Так остановка затрагивает ffmpeg вместе со всеми его дочерними процессами
+    и не задевает само приложение.
+    """
+    if os.name == 'nt':
+        kwargs['creationflags'] = kwargs.get('creationflags', 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    return subprocess.Popen(cmd, **kwargs)
+
+
+def _signal_group(process: subprocess.Popen, force: bool) -> None:
+    """Отправляет сигнал остановки всей группе процессов."""
+    try:
+        if os.name == 'nt':
+            if force:
+                # taskkill /T завершает и дочерние процессы
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(process.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (OSError, ValueError):
+        # Процесс уже завершился
+        pass
+
+
+def terminate_process(process: subprocess.Popen, timeout: float = TERMINATE_GRACE_SECONDS) -> None:
+    """
+    Останавливает процесс, запущенный через start_process, и дожидается его завершения.
+
+    Сначала группе отправляется SIGTERM (ffmpeg успевает закрыть файлы), а если
+    процесс не завершился за timeout секунд — SIGKILL. Завершенный процесс
+    всегда забирается wait(), чтобы не оставалось зомби.
+    """
+    if process.poll() is not None:
+        return
+    _signal_group(process, force=False)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        _signal_group(process, force=True)
+        process.wait()
+
+
+def _watch_stop(process: subprocess.Popen, stop_event: Optional[Event]) -> None:
+    """Останавливает процесс сразу после установки stop_event (в отдельном потоке)."""
+    if stop_event is None:
+        return
+
+    def watch() -> None:
+        while process.poll() is None:
+            if stop_event.wait(STOP_POLL_SECONDS):
+                terminate_process(process)
+                return
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def run_ffmpeg(cmd: List[str], progress_callback: Optional[Callable[[FFmpegProgress], None]] = None,
+               stop_event: Optional[Event] = None, duration: Optional[float] = None,
+               on_start: Optional[Callable[[subprocess.Popen], None]] = None) -> bool:
+    """
+    Выполняет команду FFmpeg и ждет ее завершения.
+
+    Если передан progress_callback, ffmpeg запускается с -progress pipe:1 и
+    прогресс считается по out_time относительно длительности входного файла
+    (duration, если она не передана, берется из probe). Возвращает False, если
+    выполнение было остановлено через stop_event, и выбрасывает FFmpegError
+    при ненулевом коде завершения.
+    """
+    if stop_event is not None and stop_event.is_set():
+        return False
+    stderr = StderrBuffer()
+    if progress_callback is None:
+        process = start_process(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                universal_newlines=True, errors='replace')
+        if on_start:
+            on_start(process)
+        _watch_stop(process, stop_event)
+        stderr_reader = _drain(process.stderr, stderr)
+        exit_code = process.wait()
+        stderr_reader.join()
+        if stop_event is not None and stop_event.is_set():
+            return False
+        if exit_code != 0:
+            _raise_for_exit(exit_code, stderr)
+        return True
+
+    if duration is None:
+        try:
+            duration = probe(_input_path(cmd)).duration
+        except ProbeError:
+            duration = 0.0
+    process = start_process(_with_progress_output(cmd), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True, errors='replace', bufsize=1)
+    if on_start:
+        on_start(process)
+    _watch_stop(process, stop_event)
+    stderr_reader = _drain(process.stderr, stderr)
+
+    progress = FFmpegProgress(duration=duration)
+    for line in iter(process.stdout.readline, ''):
+        key, _, value = line.strip().partition('=')
+        if key != 'progress':
+            _update_progress(progress, key, value)
+            continue
+        # Строка progress=continue/end завершает очередной блок значений
+        if duration > 0:
+            progress.percent = min(int(progress.out_time * 100 / duration), 100)
+            if progress.speed > 0:
+                progress.eta = max(0.0, (duration - progress.out_time) / progress.speed)
+        if value == 'end':
+            progress.percent, progress.eta = 100, 0.0
+        progress_callback(progress)
+    exit_code = process.wait()
+    stderr_reader.join()
+    if stop_event is not None and stop_event.is_set():
+        return False
+    if exit_code != 0:
+        _raise_for_exit(exit_code, stderr)
+    return True
+
+
+def read_ffmpeg_output(cmd: List[str], stop_event: Optional[Event] = None,
+                       on_start: Optional[Callable[[subprocess.Popen], None]] = None) -> Optional[bytes]:
+    """
+    Выполняет команду FFmpeg, которая пишет результат в stdout (pipe:1), и возвращает вывод.
+
+    Возвращает None, если выполнение было остановлено через stop_event, и
+    выбрасывает FFmpegError при ненулевом коде завершения.
+    """
+    if stop_event is not None and stop_event.is_set():
+        return None
+    stderr = StderrBuffer()
+    process = start_process(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if on_start:
+        on_start(process)
+    _watch_stop(process, stop_event)
+    stderr_reader = _drain(io.TextIOWrapper(process.stderr, errors='replace'), stderr)
+    chunks = []
+    while True:
+        chunk = process.stdout.read1(OUTPUT_CHUNK_BYTES)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    exit_code = process.wait()
+    stderr_reader.join()
+    if stop_event is not None and stop_event.is_set():
+        return None
+    if exit_code != 0:
+        _raise_for_exit(exit_code, stderr)
+    return b''.join(chunks)
+
 
 class FFmpegProcessor(QThread):
     """Класс для асинхронного выполнения команд FFmpeg."""
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
     progress = pyqtSignal(int)
+    progress_info = pyqtSignal(object)  # FFmpegProgress
 
-    def __init__(self, cmd: List[str], output_path: Optional[str] = None, parse_progress: bool = False, total_frames: Optional[int] = None):
+    def __init__(self, cmd: List[str], output_path: Optional[str] = None, parse_progress: bool = False, duration: Optional[float] = None):
         super().__init__()
         self.cmd = cmd
         self.output_path = output_path
         self.parse_progress = parse_progress
-        self.total_frames = total_frames
+        self.duration = duration
         self.process = None
         self.stop_event = Event()
 
     def run(self) -> None:
         """Запускает выполнение команды FFmpeg."""
         try:
-            if self.parse_progress:
-                try:
-                    # Сначала получаем общее количество фреймов для расчета процентов
-                    if not self.total_frames:
-                        duration_cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', 
-                                      '-show_entries', 'stream=nb_frames', 
-                                      '-of', 'default=noprint_wrappers=1:nokey=1', 
-                                      self.cmd[self.cmd.index('-i')+1]]
-                        try:
-                            result = subprocess.check_output(duration_cmd, stderr=subprocess.STDOUT)
-                            self.total_frames = int(result.decode('utf-8').strip()) or 1000
-                        except:
-                            self.total_frames = 1000  # Значение по умолчанию
-                    self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
-                                                  universal_newlines=True, bufsize=1)
-                    stderr_lines = []
-                    for line in iter(self.process.stderr.readline, ''):
-                        if self.stop_event.is_set():
-                            self.process.terminate()
-                            break
-                        stderr_lines.append(line)
-                        if 'frame=' in line:
-                            try:
-                                frame_parts = line.split('frame=')[1].strip().split(' ')[0]
-                                current_frame = int(frame_parts)
-                                percent = min(int(current_frame * 100 / self.total_frames), 100)
-                                self.progress.emit(percent)
-                            except (ValueError, IndexError):
-                                pass
-                    if not self.stop_event.is_set():
-                        exit_code = self.process.wait()
-                        if exit_code == 0:
-                            self.finished.emit(self.output_path or "OK")
-                        else:
-                            error_msg = f"FFmpeg завершился с ошибкой: код {exit_code}\n" + ''.join(stderr_lines)
-                            self.error.emit(error_msg)
-                except Exception as e:
-                    self.error.emit(str(e))
-            else:
-                result = subprocess.run(self.cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            completed = run_ffmpeg(
+                self.cmd,
+                progress_callback=self._report_progress if self.parse_progress else None,
+                stop_event=self.stop_event,
+                duration=self.duration,
+                on_start=self._set_process,
+            )
+            if completed:
                 self.finished.emit(self.output_path or "OK")
-        except subprocess.CalledProcessError as e:
-            stderr = e.stderr.decode('utf-8') if hasattr(e.stderr, 'decode') else str(e.stderr)
-            self.error.emit(f"FFmpeg ошибка: {e}\n{stderr}")
         except Exception as e:
             self.error.emit(str(e))
 
-    def stop(self) -> None:
-        """Останавливает выполнение FFmpeg."""
-        if self.process:
-            self.stop_event.set()
+    def _report_progress(self, progress: FFmpegProgress) -> None:
+        self.progress.emit(progress.percent)
+        self.progress_info.emit(replace(progress))
 
+    def _set_process(self, process: subprocess.Popen) -> None:
+        self.process = process
 
-def create_ffmpeg_command(input_path: str, output_path: str, filter_str: Optional[str], is_preview: bool = False, frame_time: str = "00:00:00.2") -> List[str]:
-    """Создает команду ffmpeg на основе параметров."""
-    cmd = ['ffmpeg', '-y']
-    
-    # Для превью берем указанный кадр, по умолчанию 0.2 секунды
-    if is_preview:
-        cmd.extend(['-ss', frame_time, '-i', input_path])
-    else:
-        cmd.extend(['-i', input_path])
-    
-    # Если фильтр содержит overlay или именованные потоки — используем -filter_complex
-    if filter_str and ("overlay" in filter_str or "[" in filter_str):
-        cmd.extend(['-filter_complex', filter_str])
-    elif filter_str:
-        cmd.extend(['-vf', filter_str])
-    else:
-        # Если нет фильтров, оставляем видео без изменений
-        pass
-        
-    # Для превью берем только один кадр
-    if is_preview:
-        cmd.extend(['-frames:v', '1', '-update', '1'])
-    else:
-        # При обработке полного видео копируем аудио дорожку, если она есть
-        cmd.extend(['-c:a', 'copy'])
-        
-    cmd.append(output_path)
-    return cmd
+    def stop(self) -> None:
+        """Останавливает выполнение FFmpeg (процесс завершается сразу, а не после очередной строки вывода)."""
+        self.stop_event.set()
 
 
 def check_ffmpeg_available() -> bool:
@@ -129,4 +429,60 @@ def cleanup_temp_files(temp_dir: str, max_age_hours: int = 1) -> None:
             if os.path.isfile(file_path) and now - os.path.getmtime(file_path) > max_age_hours * 3600:
                 os.remove(file_path)
     except Exception as e:
-        print(f"Ошибка при очистке временных файлов: {e}") 
\ No newline at end of file
+        print(f"Ошибка при очистке временных файлов: {e}")
+
+
+def _stream_copy_codecs(info: MediaInfo, output_format: str) -> Tuple[bool, bool]:
+    """Можно ли скопировать видео и все аудиодорожки в контейнер без перекодирования."""
+    video = info.video
+    video_ok = video is not None and video.codec_name in COPY_VIDEO_CODECS.get(output_format, ())
+    audio_ok = all(stream.codec_name in COPY_AUDIO_CODECS.get(output_format, ())
+                   for stream in info.streams if stream.codec_type == 'audio')
+    return video_ok, audio_ok
+
+
+def can_stream_copy(info: Optional[MediaInfo], output_format: str, copy_audio: bool = True) -> bool:
+    """Проверяет, можно ли сконвертировать файл простой перепаковкой (-c copy)."""
+    if info is None:
+        return False
+    video_ok, audio_ok = _stream_copy_codecs(info, output_format)
+    return video_ok and (audio_ok or not copy_audio)
+
+
+def create_convert_command(input_path: str, output_path: str, output_format: str, copy_audio: bool = True,
+                           info: Optional[MediaInfo] = None, force_reencode: bool = False) -> List[str]:
+    """
+    Создает команду ffmpeg для конвертации без потери качества.
+
+    Если передан info и кодеки исходника подходят для выбранного контейнера,
+    видео копируется без перекодирования. force_reencode отключает эту проверку.
+    """
+    cmd = ['ffmpeg', '-y', '-i', input_path]
+    format_info = VIDEO_FORMATS[output_format]
+    video_copy, audio_copy = _stream_copy_codecs(info, output_format) if info and not force_reencode else (False, False)
+    
+    if video_copy:
+        # Перепаковка: берем видео и все аудиодорожки, субтитры и данные могут быть несовместимы с контейнером
+        cmd.extend(['-map', '0:v:0', '-map', '0:a?', '-c:v', 'copy'])
+    else:
+        # Добавляем настройки видеокодека
+        cmd.extend(['-c:v', format_info['codec']])
+        
+        # Добавляем дополнительные параметры для кодека
+        if format_info['params']:
+            cmd.extend(format_info['params'])
+    
+    # Настройки аудио
+    if copy_audio and (audio_copy or not video_copy):
+        cmd.extend(['-c:a', 'copy'])
+    else:
+        # Используем lossless аудиокодек
+        if output_format == 'webm':
+            cmd.extend(['-c:a', 'libopus', '-b:a', '192k'])
+        else:
+            cmd.extend(['-c:a', 'flac'])
+    
+    # Выходной файл
+    cmd.append(output_path)
+    
+    return cmd
@@ -1,8 +1,8 @@
 """
 Общие виджеты для использования во всем приложении.
 """
-from PyQt5.QtWidgets import QPushButton, QLabel
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import QPushButton, QLabel, QWidget
+from PyQt5.QtCore import Qt, QRect, pyqtSignal
 from PyQt5.QtGui import QPixmap, QPainter, QColor, QPen
 
 
@@ -28,11 +28,17 @@ class AspectFrameLabel(QLabel):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._pixmap = None
+        self._scaled = None  # Масштабированная копия для текущего размера виджета
 
     def setPixmap(self, pixmap):
         self._pixmap = pixmap
+        self._scaled = None
         self.update()
 
+    def setImage(self, image):
+        """Устанавливает изображение из QImage (конвертация выполняется в GUI-потоке)."""
+        self.setPixmap(QPixmap.fromImage(image))
+
     def paintEvent(self, event):
         super().paintEvent(event)
         painter = QPainter(self)
@@ -46,6 +52,96 @@ class AspectFrameLabel(QLabel):
             scaled_w, scaled_h = int(pm_w * scale), int(pm_h * scale)
             x = (widget_w - scaled_w) // 2
             y = (widget_h - scaled_h) // 2
-            painter.drawPixmap(x, y, self._pixmap.scaled(scaled_w, scaled_h, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            # Масштабируем только при смене изображения или размера, а не при каждой перерисовке
+            if self._scaled is None or (self._scaled.width(), self._scaled.height()) != (scaled_w, scaled_h):
+                self._scaled = self._pixmap.scaled(scaled_w, scaled_h, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            painter.drawPixmap(x, y, self._scaled)
         
-        painter.end() 
\ No newline at end of file
+        painter.end()
+
+
+class FilmstripSlider(QWidget):
+    """Шкала времени с лентой миниатюр: щелчок или перетаскивание выбирает кадр."""
+
+    position_changed = pyqtSignal(float)   # Позиция меняется во время перетаскивания
+    position_selected = pyqtSignal(float)  # Кнопка мыши отпущена на позиции
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._duration = 0.0
+        self._position = 0.0
+        self._pixmaps = []
+        self._dragging = False
+        self.setMinimumHeight(48)
+        self.setCursor(Qt.PointingHandCursor)
+
+    def setDuration(self, duration):
+        self._duration = max(0.0, duration)
+        self._position = min(self._position, self._duration)
+        self.update()
+
+    def setFrames(self, frames):
+        """Устанавливает миниатюры из QImage (конвертация выполняется в GUI-потоке)."""
+        self._pixmaps = [QPixmap.fromImage(frame) for frame in frames]
+        self.update()
+
+    def clear(self):
+        self._duration = 0.0
+        self._position = 0.0
+        self._pixmaps = []
+        self.update()
+
+    def position(self):
+        return self._position
+
+    def setPosition(self, seconds):
+        self._position = min(max(0.0, seconds), self._duration)
+        self.update()
+
+    def _position_at(self, x):
+        if self.width() <= 0:
+            return 0.0
+        return min(max(0.0, x / self.width()), 1.0) * self._duration
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton or not self._duration:
+            return
+        self._dragging = True
+        self.setPosition(self._position_at(event.x()))
+        self.position_changed.emit(self._position)
+
+    def mouseMoveEvent(self, event):
+        if not self._dragging:
+            return
+        self.setPosition(self._position_at(event.x()))
+        self.position_changed.emit(self._position)
+
+    def mouseReleaseEvent(self, event):
+        if not self._dragging or event.button() != Qt.LeftButton:
+            return
+        self._dragging = False
+        self.setPosition(self._position_at(event.x()))
+        self.position_selected.emit(self._position)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width, height = self.width(), self.height()
+        painter.fillRect(0, 0, width, height, QColor('#151515'))
+
+        # Миниатюры растягиваются на равные ячейки по ширине шкалы
+        if self._pixmaps:
+            count = len(self._pixmaps)
+            for index, pixmap in enumerate(self._pixmaps):
+                left = index * width // count
+                right = (index + 1) * width // count
+                painter.drawPixmap(QRect(left, 0, right - left, height), pixmap)
+
+        painter.setPen(QPen(QColor('#444444'), 1))
+        painter.drawRect(0, 0, width - 1, height - 1)
+
+        # Текущая позиция
+        if self._duration:
+            x = int(self._position / self._duration * (width - 1))
+            painter.setPen(QPen(QColor('#ffffff'), 2))
+            painter.drawLine(x, 0, x, height)
+        painter.end()
@@ -6,8 +6,7 @@ from PyQt5.QtWidgets import (
     QFileDialog, QFrame, QSpacerItem, QSizePolicy, QTabWidget
 )
 from PyQt5.QtCore import Qt, QThread, QSize, QRect, pyqtSignal, QTimer
-from PyQt5.QtGui import QPixmap, QFont, QPainter, QColor, QPen
-import urllib.request
+from PyQt5.QtGui import QImage, QPixmap, QFont, QPainter, QColor, QPen
 import time
 import weakref
 import os
@@ -16,8 +15,10 @@ from pathlib import Path
 from typing import Optional, Dict, List
 
 from vidify.core.downloader import (
-    VideoDownloader, VideoInfoFetcher, DownloadStatus, is_valid_url, setup_paths, open_folder
+    VideoInfoFetcher, DownloadStatus, is_valid_url, setup_paths, open_folder
 )
+from vidify.core.download_manager import DownloadManager
+from vidify.core.thumbnail_cache import ThumbnailCache
 
 
 # Выносим класс для отображения миниатюр за пределы метода, чтобы его можно было переиспользовать
@@ -89,24 +90,25 @@ class AspectRatioPixmapLabel(QLabel):
 class ThumbnailLoader(QThread):
     """Поток для асинхронной загрузки миниатюр."""
     
-    thumbnail_ready = pyqtSignal(QPixmap)
+    thumbnail_ready = pyqtSignal(QImage)
     error = pyqtSignal()
     
-    def __init__(self, url):
+    def __init__(self, url, cache, width, height):
         super().__init__()
         self.url = url
+        self.cache = cache
+        self.width = width
+        self.height = height
         
     def run(self):
         try:
-            # Устанавливаем короткий таймаут для быстрого ответа
-            req = urllib.request.Request(
-                self.url,
-                headers={'User-Agent': 'Mozilla/5.0'}
-            )
-            data = urllib.request.urlopen(req, timeout=3).read()
-            pixmap = QPixmap()
-            pixmap.loadFromData(data)
-            self.thumbnail_ready.emit(pixmap)
+            # Изображение берется из кэша или скачивается, декодируется и уменьшается
+            # до размера показа здесь же; в потоке интерфейса остается только QPixmap.fromImage
+            image = self.cache.load(self.url, self.width, self.height)
+            if image.isNull():
+                self.error.emit()
+                return
+            self.thumbnail_ready.emit(image)
         except Exception:
             self.error.emit()
 
@@ -126,12 +128,12 @@ class DownloadScreen(QWidget):
         self.is_downloading = False
         self.input_path, self.output_path, self.temp_path = setup_paths()
         self.save_path = self.input_path
-        self.download_thread: Optional[VideoDownloader] = None
+        self.download_manager = DownloadManager()
+        self.thumbnail_cache = ThumbnailCache(str(Path(__file__).parent.parent.parent / 'data' / 'thumbnails'))
         self.info_thread: Optional[VideoInfoFetcher] = None
         self.thumbnail_loader: Optional[ThumbnailLoader] = None
         self.video_info: Optional[Dict] = None
         self._last_fetched_url = ''
-        self.progress_complete = False
         
         # Активные потоки для освобождения ресурсов
         self._active_threads: List[QThread] = []
@@ -139,6 +141,12 @@ class DownloadScreen(QWidget):
         # Инициализация UI
         self._init_ui()
         
+        # Сигналы очереди скачиваний
+        self.download_manager.job_progress.connect(self._on_job_progress)
+        self.download_manager.job_failed.connect(self._on_download_error)
+        self.download_manager.job_finished.connect(self._on_job_finished)
+        self.download_manager.queue_finished.connect(self.on_download_finished)
+        
         # Таймер для отложенного поиска
         self.url_timer = QTimer()
         self.url_timer.setSingleShot(True)
@@ -361,10 +369,9 @@ class DownloadScreen(QWidget):
     def _set_ui_state(self, downloading: bool) -> None:
         """Управляет состоянием UI-кнопок в зависимости от загрузки."""
         self.is_downloading = downloading
-        self.download_button.setEnabled(not downloading and self.video_info is not None)
-        self.folder_button.setEnabled(not downloading)
+        # Во время скачивания можно добавлять новые ссылки в очередь
+        self.download_button.setEnabled(self.video_info is not None)
         self.cancel_button.setEnabled(downloading)
-        self.url_input.setEnabled(not downloading)
         self.convert_button.setEnabled(not downloading)
 
     def choose_folder(self) -> None:
@@ -450,12 +457,17 @@ class DownloadScreen(QWidget):
             if self.thumbnail_loader and self.thumbnail_loader.isRunning():
                 self._cancel_thread(self.thumbnail_loader)
                 
-            # Создаем и запускаем поток для загрузки миниатюры
-            self.thumbnail_loader = ThumbnailLoader(thumbnail_url)
+            # Создаем и запускаем поток для загрузки миниатюры (размер с учетом плотности пикселей экрана)
+            ratio = self.devicePixelRatioF()
+            size = self.thumbnail_container.size()
+            self.thumbnail_loader = ThumbnailLoader(
+                thumbnail_url, self.thumbnail_cache,
+                int(size.width() * ratio), int(size.height() * ratio)
+            )
             
             # Создаем специальную функцию для обработки миниатюры
-            def process_thumbnail(pixmap):
-                self.thumbnail_label.setPixmap(pixmap)
+            def process_thumbnail(image):
+                self.thumbnail_label.setPixmap(QPixmap.fromImage(image))
                 self.thumbnail_label.setText("")
             
             self.thumbnail_loader.thumbnail_ready.connect(process_thumbnail)
@@ -480,11 +492,7 @@ class DownloadScreen(QWidget):
         self._set_status(DownloadStatus.ERROR, error=error_msg)
 
     def download_video(self) -> None:
-        """Скачивает видео."""
-        if self.is_downloading:
-            self._set_status(DownloadStatus.ALREADY)
-            return
-            
+        """Добавляет видео в очередь скачивания."""
         url = self.url_input.text().strip()
         if not url:
             self._set_status(DownloadStatus.NO_URL)
@@ -498,53 +506,59 @@ class DownloadScreen(QWidget):
             self._set_status(DownloadStatus.ERROR, error="Папка для сохранения не существует!")
             return
             
+        # Новая очередь начинается с нуля, завершенные задачи больше не нужны
+        if not self.is_downloading:
+            self.download_manager.clear_finished()
+            self.progress_bar.setValue(0)
+            self._set_status(DownloadStatus.PREPARE)
+            
         self._set_ui_state(True)
-        self.progress_bar.setValue(0)
-        self._set_status(DownloadStatus.PREPARE)
-        
-        # Если есть предыдущий поток загрузки, отменяем его
-        if self.download_thread and self.download_thread.isRunning():
-            self._cancel_thread(self.download_thread)
-        
-        # Создаем и запускаем поток скачивания
-        self.download_thread = VideoDownloader(url, str(self.save_path))
-        
-        # Флаг для контроля обновлений прогресс-бара
-        self.progress_complete = False
-        
-        # Оборачиваем функцию обновления прогресс-бара
-        def update_progress(value):
-            if not self.progress_complete:
-                self.progress_bar.setValue(value)
-                if value == 100:
-                    self.progress_complete = True
-        
-        self.download_thread.update_progress.connect(update_progress)
-        self.download_thread.update_status.connect(self.status_label.setText)
-        self.download_thread.download_complete.connect(self.on_download_finished)
-        self.download_thread.finished_with_error.connect(self._on_download_error)
-        
-        # Добавляем поток в список активных и запускаем
-        self._add_active_thread(self.download_thread)
-        self.download_thread.start()
+        self.download_manager.add_url(url, self.save_path)
+        self._update_queue_status()
+
+    def _update_queue_status(self) -> None:
+        """Показывает состояние очереди скачиваний."""
+        active = self.download_manager.active_count()
+        pending = self.download_manager.pending_count()
+        status = DownloadStatus.DOWNLOADING.value
+        if active or pending:
+            status += f" (активно: {active}, в очереди: {pending})"
+        self.status_label.setText(status)
+
+    def _on_job_progress(self, job_id: int, percent: int) -> None:
+        """Обновляет общий прогресс очереди."""
+        if self.is_downloading:
+            self.progress_bar.setValue(self.download_manager.total_progress())
+            self._update_queue_status()
+
+    def _on_job_finished(self, job_id: int, filepath: str) -> None:
+        """Обработчик завершения одной задачи очереди."""
+        if self.is_downloading and self.download_manager.is_busy():
+            self._update_queue_status()
 
     def cancel_download(self) -> None:
-        """Отменяет скачивание."""
-        if self.download_thread and self.is_downloading:
-            self.download_thread.abort()
+        """Отменяет все скачивания в очереди."""
+        if self.is_downloading:
+            self.download_manager.cancel_all()
             self._set_ui_state(False)
             self._set_status(DownloadStatus.CANCELED)
             self.progress_bar.setValue(0)
 
     def on_download_finished(self) -> None:
-        """Обработчик окончания скачивания."""
+        """Обработчик окончания всех скачиваний."""
+        if not self.is_downloading:
+            return
         self._set_ui_state(False)
-        self._set_status(DownloadStatus.FINISHED)
+        self.progress_bar.setValue(100)
+        jobs = self.download_manager.jobs
+        failed = [job for job in jobs if job.error]
+        if failed:
+            self._set_status(DownloadStatus.ERROR, error=f"не удалось скачать {len(failed)} из {len(jobs)}")
+        else:
+            self._set_status(DownloadStatus.FINISHED)
 
-    def _on_download_error(self, error_msg: str) -> None:
+    def _on_download_error(self, job_id: int, error_msg: str) -> None:
         """Обработчик ошибок скачивания."""
-        self._set_ui_state(False)
-        self.progress_bar.setValue(0)
         self._set_status(DownloadStatus.ERROR, error=error_msg)
 
     def open_download_folder(self) -> None:
@@ -602,6 +616,7 @@ class DownloadScreen(QWidget):
         """Обработчик закрытия виджета."""
         # Отменяем все активные потоки перед закрытием
         self._cancel_active_threads()
+        self.download_manager.shutdown()
         super().closeEvent(event)
 
     def _add_overlay_image(self) -> None:
@@ -2,17 +2,19 @@
 Экран для конвертации видео без потери качества.
 """
 import os
-import subprocess
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QSizePolicy,
     QProgressBar, QFrame, QLineEdit, QComboBox, QFormLayout, QGroupBox, QCheckBox
 )
 from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QPixmap
 
 from vidify.core.video_processor import (
-    FFmpegProcessor, create_ffmpeg_command, check_ffmpeg_available, cleanup_temp_files
+    FFmpegProcessor, VIDEO_FORMATS, can_stream_copy, check_ffmpeg_available, cleanup_temp_files,
+    create_convert_command
 )
+from vidify.core.preview_engine import decode_frame
+from vidify.core.probe import probe
+from vidify.core.tasks import TaskRunner
 from vidify.ui.components.widgets import AspectFrameLabel
 
 
@@ -38,40 +40,20 @@ class VideoConvertScreen(QWidget):
         self.input_path = ''
         self.output_path = ''
         self._ffmpeg_convert_worker = None
+        self.task_runner = TaskRunner(parent=self)  # Фоновые ffprobe и извлечение кадров
         self.output_format = 'mp4'
         
         # Доступные форматы
-        self.video_formats = {
-            'mp4': {
-                'extension': 'mp4',
-                'codec': 'libx264',
-                'params': ['-preset', 'slow', '-crf', '0']
-            },
-            'mkv': {
-                'extension': 'mkv',
-                'codec': 'libx264',
-                'params': ['-preset', 'slow', '-crf', '0']
-            },
-            'avi': {
-                'extension': 'avi',
-                'codec': 'huffyuv',
-                'params': []
-            },
-            'mov': {
-                'extension': 'mov',
-                'codec': 'prores_ks',
-                'params': ['-profile:v', '4444']
-            },
-            'webm': {
-                'extension': 'webm',
-                'codec': 'libvpx-vp9',
-                'params': ['-lossless', '1']
-            }
-        }
+        self.video_formats = VIDEO_FORMATS
         
         # Настройки копирования аудио
         self.copy_audio = True
         
+        # Перекодировать даже если возможна перепаковка без перекодирования
+        self.force_reencode = False
+        self.video_info = None
+        self._status_prefix = 'Конвертация видео'
+        
         # Инициализация интерфейса
         self._init_ui()
         
@@ -131,6 +113,12 @@ class VideoConvertScreen(QWidget):
         self.audio_checkbox.toggled.connect(self._on_audio_copy_toggled)
         format_layout.addRow("", self.audio_checkbox)
         
+        # Чекбокс принудительного перекодирования
+        self.reencode_checkbox = QCheckBox("Всегда перекодировать видео")
+        self.reencode_checkbox.setChecked(False)
+        self.reencode_checkbox.toggled.connect(self._on_reencode_toggled)
+        format_layout.addRow("", self.reencode_checkbox)
+        
         # Информация о видео
         self.info_label = QLabel("Загрузите видео для конвертации")
         self.info_label.setWordWrap(True)
@@ -152,7 +140,9 @@ class VideoConvertScreen(QWidget):
             "• MKV: H.264 (CRF 0)\n"
             "• AVI: HuffYUV\n"
             "• MOV: ProRes 4444\n"
-            "• WEBM: VP9 Lossless"
+            "• WEBM: VP9 Lossless\n\n"
+            "Если кодеки исходного видео совместимы с выбранным форматом, "
+            "видео перепаковывается без перекодирования."
         )
         note_label.setWordWrap(True)
         note_label.setStyleSheet("font-size: 12px;")
@@ -229,6 +219,10 @@ class VideoConvertScreen(QWidget):
         """Обработчик переключения копирования аудио."""
         self.copy_audio = checked
     
+    def _on_reencode_toggled(self, checked):
+        """Обработчик переключения принудительного перекодирования."""
+        self.force_reencode = checked
+    
     def choose_file(self):
         """Открывает диалог выбора видеофайла."""
         path, _ = QFileDialog.getOpenFileName(
@@ -241,110 +235,65 @@ class VideoConvertScreen(QWidget):
             self.file_btn.setText(os.path.basename(path))
             self.convert_btn.setEnabled(True)
             
-            # Определяем размер видео и показываем информацию
-            self._get_video_info(path)
-            
-            # Показываем превью
-            self._show_preview_frame(path)
+            # Информация и превью получаются в фоне, результаты для прежнего файла отбрасываются
+            self.task_runner.cancel()
+            self.video_info = None
+            self.info_label.setText("Чтение информации о видео...")
+            self.task_runner.submit(
+                probe, path,
+                on_result=self._on_video_info_ready,
+                on_error=self._on_video_info_error,
+            )
         else:
             self.convert_btn.setEnabled(False)
     
-    def _get_video_info(self, video_path):
-        """Получает информацию о видео с помощью ffprobe."""
-        try:
-            # Получаем размеры
-            cmd_dimensions = [
-                'ffprobe', 
-                '-v', 'error', 
-                '-select_streams', 'v:0', 
-                '-show_entries', 'stream=width,height', 
-                '-of', 'csv=s=x:p=0', 
-                video_path
-            ]
-            dimensions = subprocess.check_output(cmd_dimensions).decode('utf-8').strip()
-            width, height = map(int, dimensions.split('x'))
-            
-            # Получаем кодек и битрейт
-            cmd_codec = [
-                'ffprobe',
-                '-v', 'error',
-                '-select_streams', 'v:0',
-                '-show_entries', 'stream=codec_name,bit_rate',
-                '-of', 'default=noprint_wrappers=1',
-                video_path
-            ]
-            codec_info = subprocess.check_output(cmd_codec).decode('utf-8').strip()
-            
-            # Получаем информацию о формате
-            cmd_format = [
-                'ffprobe',
-                '-v', 'error',
-                '-show_entries', 'format=format_name,size',
-                '-of', 'default=noprint_wrappers=1',
-                video_path
-            ]
-            format_info = subprocess.check_output(cmd_format).decode('utf-8').strip()
-            
-            # Парсим данные и формируем информацию
-            codec_name = "неизвестно"
-            bitrate = "неизвестно"
-            format_name = "неизвестно"
-            size_bytes = 0
-            
-            for line in codec_info.split('\n'):
-                if line.startswith('codec_name='):
-                    codec_name = line.split('=')[1]
-                elif line.startswith('bit_rate='):
-                    try:
-                        bitrate_val = int(line.split('=')[1])
-                        bitrate = f"{bitrate_val / 1000000:.2f} Мбит/с"
-                    except (ValueError, IndexError):
-                        pass
-            
-            for line in format_info.split('\n'):
-                if line.startswith('format_name='):
-                    format_name = line.split('=')[1]
-                elif line.startswith('size='):
-                    try:
-                        size_bytes = int(line.split('=')[1])
-                        size_mb = size_bytes / (1024 * 1024)
-                        if size_mb > 1024:
-                            size = f"{size_mb / 1024:.2f} ГБ"
-                        else:
-                            size = f"{size_mb:.2f} МБ"
-                    except (ValueError, IndexError):
-                        size = "неизвестно"
-            
-            # Обновляем информацию
-            info_text = f"Размер: {width}x{height}\nКодек: {codec_name}\nБитрейт: {bitrate}\nФормат: {format_name}\nРазмер файла: {size}"
-            self.info_label.setText(info_text)
-            
-        except Exception as e:
-            self.show_error(f"Не удалось получить информацию о видео: {str(e)}")
-            self.info_label.setText("Ошибка получения информации")
-    
-    def _show_preview_frame(self, video_path):
-        """Показывает превью кадра из видео."""
-        preview_path = os.path.join(self.temp_dir, 'convert_preview.png')
-        try:
-            # Команда для получения кадра
-            cmd = [
-                'ffmpeg', '-y', '-ss', '00:00:00.5', 
-                '-i', video_path, 
-                '-frames:v', '1', 
-                preview_path
-            ]
-            subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            # Устанавливаем превью
-            if os.path.exists(preview_path):
-                pixmap = QPixmap(preview_path)
-                self.preview_label.setPixmap(pixmap)
+    def _on_video_info_ready(self, info):
+        """Показывает информацию о видео и запускает извлечение кадра превью."""
+        video = info.video
+        if video is None:
+            self._on_video_info_error('видеопоток не найден')
+            return
+        
+        self.video_info = info
+        
+        # Формируем информацию
+        codec_name = video.codec_name or "неизвестно"
+        bitrate = "неизвестно"
+        if video.bit_rate:
+            bitrate = f"{video.bit_rate / 1000000:.2f} Мбит/с"
+        format_name = info.format_name or "неизвестно"
+        size = "неизвестно"
+        if info.size:
+            size_mb = info.size / (1024 * 1024)
+            if size_mb > 1024:
+                size = f"{size_mb / 1024:.2f} ГБ"
             else:
-                self.preview_label.setText("Не удалось создать превью")
-        except Exception as e:
-            self.show_error(f"Ошибка создания превью: {str(e)}")
-            self.preview_label.setText("Ошибка превью")
+                size = f"{size_mb:.2f} МБ"
+        
+        # Обновляем информацию
+        info_text = f"Размер: {video.width}x{video.height}\nКодек: {codec_name}\nБитрейт: {bitrate}\nФормат: {format_name}\nРазмер файла: {size}"
+        self.info_label.setText(info_text)
+        
+        # Показываем превью
+        self._show_preview_frame(info.path, video.width, video.height)
+    
+    def _on_video_info_error(self, error):
+        """Вызывается, если информацию о видео получить не удалось."""
+        self.show_error(f"Не удалось получить информацию о видео: {error}")
+        self.info_label.setText("Ошибка получения информации")
+    
+    def _show_preview_frame(self, video_path, width, height):
+        """Извлекает кадр превью из видео в фоновом потоке."""
+        self.task_runner.submit(
+            decode_frame, video_path, '00:00:00.5', width, height,
+            on_result=self.preview_label.setImage,
+            on_error=self._on_preview_error,
+        )
+    
+    def _on_preview_error(self, error):
+        """Вызывается при ошибке извлечения кадра превью."""
+        self.show_error(f"Ошибка создания превью: {error}")
+        self.preview_label.setText("Ошибка превью")
     
     def convert_video(self):
         """Конвертирует видео в выбранный формат без потери качества."""
@@ -365,34 +314,17 @@ class VideoConvertScreen(QWidget):
     
     def _create_convert_command(self):
         """Создает команду ffmpeg для конвертации без потери качества."""
-        cmd = ['ffmpeg', '-y', '-i', self.input_path]
-        
-        # Добавляем настройки видеокодека
-        format_info = self.video_formats[self.output_format]
-        cmd.extend(['-c:v', format_info['codec']])
-        
-        # Добавляем дополнительные параметры для кодека
-        if format_info['params']:
-            cmd.extend(format_info['params'])
-        
-        # Настройки аудио
-        if self.copy_audio:
-            cmd.extend(['-c:a', 'copy'])
-        else:
-            # Используем lossless аудиокодек
-            if self.output_format == 'webm':
-                cmd.extend(['-c:a', 'libopus', '-b:a', '192k'])
-            else:
-                cmd.extend(['-c:a', 'flac'])
-        
-        # Выходной файл
-        cmd.append(self.output_path)
-        
-        return cmd
+        return create_convert_command(self.input_path, self.output_path, self.output_format, self.copy_audio,
+                                      info=self.video_info, force_reencode=self.force_reencode)
+    
+    def _is_stream_copy(self):
+        """Будет ли видео скопировано без перекодирования."""
+        return not self.force_reencode and can_stream_copy(self.video_info, self.output_format, self.copy_audio)
     
     def _run_conversion(self, cmd):
         """Запускает FFmpeg с отображением прогресса."""
-        self.status.setText('Конвертация видео...')
+        self._status_prefix = 'Перепаковка видео' if self._is_stream_copy() else 'Конвертация видео'
+        self.status.setText(f'{self._status_prefix}...')
         self.progress.setVisible(True)
         self.progress.setValue(0)
         self.convert_btn.setEnabled(False)
@@ -401,6 +333,7 @@ class VideoConvertScreen(QWidget):
         # Запускаем FFmpeg в отдельном потоке
         self._ffmpeg_convert_worker = FFmpegProcessor(cmd, self.output_path, parse_progress=True)
         self._ffmpeg_convert_worker.progress.connect(self._on_conversion_progress)
+        self._ffmpeg_convert_worker.progress_info.connect(self._on_conversion_progress_info)
         self._ffmpeg_convert_worker.finished.connect(self._on_conversion_ready)
         self._ffmpeg_convert_worker.error.connect(self._on_conversion_error)
         self._ffmpeg_convert_worker.start()
@@ -409,6 +342,10 @@ class VideoConvertScreen(QWidget):
         """Обновляет прогресс-бар при конвертации."""
         self.progress.setValue(percent)
     
+    def _on_conversion_progress_info(self, info):
+        """Показывает скорость конвертации и оставшееся время."""
+        self.status.setText(f'{self._status_prefix}... {info.describe()}')
+    
     def _on_conversion_ready(self, path):
         """Вызывается, когда конвертация завершена."""
         self.status.setText(f'Готово: {os.path.basename(path)}')
@@ -2,18 +2,34 @@
 Экран для редактирования и уникализации видео.
 """
 import os
-import subprocess
+from threading import Event
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QSizePolicy,
     QProgressBar, QFrame, QLineEdit, QSlider, QStyle
 )
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPixmap, QIntValidator
+from PyQt5.QtGui import QIntValidator
 
 from vidify.core.video_processor import (
-    FFmpegProcessor, create_ffmpeg_command, check_ffmpeg_available, cleanup_temp_files
+    FFmpegProcessor, check_ffmpeg_available, cleanup_temp_files
 )
-from vidify.ui.components.widgets import AspectFrameLabel, Switch
+from vidify.core.effects import EffectSpec, build_effects_command, build_filter_graph
+from vidify.core.preview_cache import PreviewCache, make_preview_key
+from vidify.core.probe import ProbeError, probe
+from vidify.core.intermediates import IntermediateCache, PrerenderedFFmpegProcessor
+from vidify.core.filmstrip import FILMSTRIP_FRAMES, FILMSTRIP_HEIGHT, generate_filmstrip
+from vidify.core.keyframes import format_timestamp, keyframe_index, parse_timestamp
+from vidify.core.proxy import PROXY_HEIGHT, create_proxy, needs_proxy, proxy_size, scale_spec
+from vidify.core.tasks import TaskRunner, long_running_pool
+from vidify.core.preview_engine import PreviewEngine, PreviewFrameLoader, PreviewRenderer, rgb24_output_args
+from vidify.core.segment_encoder import SegmentedFFmpegProcessor, should_encode_segmented
+from vidify.ui.components.widgets import AspectFrameLabel, FilmstripSlider, Switch
+
+
+# Позиции кадров превью, пока лента миниатюр не готова
+DEFAULT_TIME_POINTS = ["00:00:00.2", "00:00:02.0", "00:00:05.0", "00:00:10.0", "00:00:30.0"]
+# Задержка обновления превью (мс): изменения настроек быстрее этого интервала объединяются
+PREVIEW_DEBOUNCE_MS = 60
 
 
 class VideoEditScreen(QWidget):
@@ -40,6 +56,15 @@ class VideoEditScreen(QWidget):
         self.input_path = ''
         self._preview_worker = None
         self._ffmpeg_video_worker = None
+        self.preview_engine = None   # Декодированные кадры для быстрого превью
+        self.preview_cache = PreviewCache(disk_dir=os.path.join(self.temp_dir, 'preview_cache'))
+        self._frame_loader = None
+        self.task_runner = TaskRunner(parent=self)  # Фоновые ffprobe без блокировки интерфейса
+        # Прокси-копии и миниатюры выполняются в отдельном пуле, чтобы не задерживать ffprobe и PNG превью
+        self.background_runner = TaskRunner(pool=long_running_pool(self), parent=self)
+        self.intermediates = IntermediateCache(os.path.join(self.temp_dir, 'intermediates'))
+        self._background_stop = Event()   # Остановка фоновых ffmpeg (прокси, миниатюры) при выборе другого файла
+        self.filmstrip = None   # Миниатюры для шкалы времени
         
         # Параметры эффектов
         self.frame_enabled = False   # Рамка включена/выключена
@@ -55,15 +80,19 @@ class VideoEditScreen(QWidget):
         self.brightness_enabled = False  # Затемнение включено/выключено
         self.brightness_value = 0   # Значение яркости от 0 до 100 (0: нормальная, 100: 25% затемнения)
         self.frame_time = "00:00:00.2"  # Время кадра для превью (по умолчанию 0.2 секунды)
+        self.requested_frame_time = 0.2  # Выбранное время кадра до привязки к ключевому кадру
         
         # Информация о видео
         self.video_width = 0       # Ширина видео
         self.video_height = 0       # Высота видео
+        self.video_duration = 0.0   # Длительность видео в секундах
         self.max_crop_per_side = 0  # Максимальное значение обрезки с одной стороны (49% от высоты)
         
         # Переменные состояния
         self.output_path = ''
         self.is_preview_generating = False
+        self._preview_in_flight = False   # Строится превью (ffmpeg или декодирование кадра)
+        self._preview_pending = False     # Во время построения настройки изменились
         
         # Таймер для дебаунсинга
         self._debounce_timer = QTimer()
@@ -501,6 +530,14 @@ class VideoEditScreen(QWidget):
         self.preview_label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.preview_label.setStyleSheet('QLabel {border: 2px solid #555555; border-radius: 8px; background: #151515;}')
         preview_layout.addWidget(self.preview_label)
+
+        # Шкала времени с миниатюрами для выбора кадра превью
+        self.timeline = FilmstripSlider()
+        self.timeline.setFixedHeight(56)
+        self.timeline.setToolTip("Выберите кадр для превью")
+        self.timeline.position_changed.connect(self._on_timeline_scrub)
+        self.timeline.position_selected.connect(self._on_timeline_selected)
+        preview_layout.addWidget(self.timeline)
         
         center_layout.addWidget(self.preview_container, stretch=4)
         
@@ -843,8 +880,8 @@ class VideoEditScreen(QWidget):
         if not self.is_preview_generating:
             self.status.setText('Планирование обновления превью...')
             
-        # Полностью убираем задержку для мгновенного отклика
-        self._delayed_preview_update()
+        # Каждое изменение перезапускает таймер: превью строится, когда настройки перестают меняться
+        self._debounce_timer.start(PREVIEW_DEBOUNCE_MS)
 
     def _delayed_preview_update(self):
         """Вызывается после дебаунсинга для обновления превью"""
@@ -871,61 +908,150 @@ class VideoEditScreen(QWidget):
             self.file_btn.setText(os.path.basename(path))
             self.unique_btn.setEnabled(True)
             
-            # Определяем размеры видео
-            self._get_video_dimensions(path)
-            
-            # Показываем превью
-            self.show_preview_frame()
+            # Размеры видео определяются в фоне, результаты для прежнего файла отбрасываются
+            self.task_runner.cancel()
+            self.background_runner.cancel()
+            self._background_stop.set()
+            self._reset_preview_render()
+            self.preview_engine = None
+            self.filmstrip = None
+            self.video_duration = 0.0
+            self.frame_time = DEFAULT_TIME_POINTS[0]
+            self.requested_frame_time = parse_timestamp(self.frame_time)
+            self.timeline.clear()
+            self.status.setText('Чтение информации о видео...')
+            self.task_runner.submit(
+                probe, path,
+                on_result=self._on_video_info_ready,
+                on_error=self._on_video_info_error,
+            )
         else:
             self.unique_btn.setEnabled(False)
             
-    def _get_video_dimensions(self, video_path):
-        """Получает размеры видео с помощью ffprobe"""
+    def _on_video_info_ready(self, info):
+        """Вызывается, когда информация о видео получена"""
         try:
-            cmd = [
-                'ffprobe', 
-                '-v', 'error', 
-                '-select_streams', 'v:0', 
-                '-show_entries', 'stream=width,height', 
-                '-of', 'csv=s=x:p=0', 
-                video_path
-            ]
-            output = subprocess.check_output(cmd).decode('utf-8').strip()
-            width, height = map(int, output.split('x'))
-            
-            self.video_width = width
-            self.video_height = height
-            # Устанавливаем максимум для ползунков как 49% от высоты видео
-            self.max_crop_per_side = int(height * 0.49)
-            
-            # Обновляем максимальные значения ползунков
-            self.crop_top_slider.setMaximum(self.max_crop_per_side)
-            self.crop_bottom_slider.setMaximum(self.max_crop_per_side)
+            width, height = info.width, info.height
+            if not width or not height:
+                raise ProbeError('видеопоток не найден')
+            self._set_video_dimensions(width, height)
+            self.video_duration = info.duration or (info.video.duration if info.video else 0.0)
+        except Exception as e:
+            self._on_video_info_error(str(e))
+            return
+        self._on_video_loaded()
+        
+    def _on_video_info_error(self, error):
+        """Вызывается, если информацию о видео получить не удалось"""
+        self.show_error(f"Не удалось определить размеры видео: {error}")
+        # Установим значения по умолчанию
+        self.video_width = 1920
+        self.video_height = 1080
+        self.max_crop_per_side = 500
+        self._on_video_loaded()
+        
+    def _on_video_loaded(self):
+        """Готовит быстрое превью для выбранного видео и показывает первый кадр"""
+        self.preview_engine = PreviewEngine(self.input_path, self.video_width, self.video_height)
+        self.show_preview_frame()
+        # Индекс ключевых кадров нужен, чтобы выбирать позиции превью без долгого декодирования
+        engine = self.preview_engine
+        self.task_runner.submit(
+            keyframe_index, self.input_path,
+            on_result=lambda index: self._on_keyframes_ready(engine, index),
+            on_error=lambda error: self._on_background_error('Не удалось прочитать ключевые кадры', error),
+        )
+        self._background_stop = Event()
+        # Миниатюры для шкалы времени извлекаются одним запуском ffmpeg
+        if self.video_duration > 0:
+            self.timeline.setDuration(self.video_duration)
+            self.timeline.setPosition(parse_timestamp(self.frame_time))
+            self.background_runner.submit(
+                generate_filmstrip, self.input_path, self.video_duration,
+                self.video_width, self.video_height, FILMSTRIP_FRAMES, FILMSTRIP_HEIGHT, self._background_stop,
+                on_result=self._on_filmstrip_ready,
+                on_error=lambda error: self._on_background_error('Не удалось создать миниатюры', error),
+            )
+        # Для видео высокого разрешения превью переключается на прокси-копию, как только она будет готова
+        if needs_proxy(self.video_height):
+            self.background_runner.submit(
+                create_proxy, self.input_path, self.video_width, self.video_height,
+                os.path.join(self.temp_dir, 'proxies'), PROXY_HEIGHT, self._background_stop,
+                on_result=self._on_proxy_ready,
+                on_error=lambda error: self._on_background_error('Не удалось создать прокси-копию', error),
+            )
+
+    def _on_background_error(self, message, error):
+        """Сообщает об ошибке фоновой подготовки (редактор продолжает работать без ее результата)"""
+        self.status.setText(f'{message}: {error}')
+
+    def _on_keyframes_ready(self, engine, index):
+        """Сохраняет индекс ключевых кадров исходного видео"""
+        engine.keyframes = index
+
+    def _on_filmstrip_ready(self, filmstrip):
+        """Показывает миниатюры на шкале времени"""
+        if filmstrip is None:
+            return
+        self.filmstrip = filmstrip
+        self.timeline.setFrames(filmstrip.frames)
+
+    def _on_timeline_scrub(self, seconds):
+        """Во время перетаскивания сразу показывает ближайшую миниатюру"""
+        self.status.setText(f'Кадр: {format_timestamp(seconds)}')
+        if self.filmstrip:
+            self.preview_label.setImage(self.filmstrip.frame_at(seconds))
+
+    def _on_timeline_selected(self, seconds):
+        """Строит превью для выбранной на шкале позиции"""
+        self._select_frame_time(seconds)
+
+    def _select_frame_time(self, seconds):
+        """Устанавливает время кадра превью и обновляет превью"""
+        if not self.input_path or self.preview_engine is None:
+            return
+        self.requested_frame_time = seconds
+        # На видео с редкими ключевыми кадрами берем ближайшую позицию, которая быстро декодируется
+        self.frame_time = self.preview_engine.seek_time(format_timestamp(seconds))
+        self.timeline.setPosition(parse_timestamp(self.frame_time))
+        self.show_preview_frame()
+
+    def _on_proxy_ready(self, proxy_path):
+        """Переключает превью на прокси-копию"""
+        if not proxy_path:
+            return
+        width, height = proxy_size(self.video_width, self.video_height)
+        self.preview_engine = PreviewEngine(proxy_path, width, height)
+        self.show_preview_frame()
             
-            # Обновляем валидаторы полей ввода
-            self.crop_top_input.setValidator(QIntValidator(0, self.max_crop_per_side))
-            self.crop_bottom_input.setValidator(QIntValidator(0, self.max_crop_per_side))
+    def _set_video_dimensions(self, width, height):
+        """Применяет размеры видео к ползункам обрезки"""
+        self.video_width = width
+        self.video_height = height
+        # Устанавливаем максимум для ползунков как 49% от высоты видео
+        self.max_crop_per_side = int(height * 0.49)
+        
+        # Обновляем максимальные значения ползунков
+        self.crop_top_slider.setMaximum(self.max_crop_per_side)
+        self.crop_bottom_slider.setMaximum(self.max_crop_per_side)
+        
+        # Обновляем валидаторы полей ввода
+        self.crop_top_input.setValidator(QIntValidator(0, self.max_crop_per_side))
+        self.crop_bottom_input.setValidator(QIntValidator(0, self.max_crop_per_side))
+        
+        # Если текущие значения больше максимальных, корректируем их
+        if self.crop_top_value > self.max_crop_per_side:
+            self.crop_top_value = self.max_crop_per_side
+            self.crop_top_slider.setValue(self.max_crop_per_side)
+            self.crop_top_input.setText(str(self.max_crop_per_side))
             
-            # Если текущие значения больше максимальных, корректируем их
-            if self.crop_top_value > self.max_crop_per_side:
-                self.crop_top_value = self.max_crop_per_side
-                self.crop_top_slider.setValue(self.max_crop_per_side)
-                self.crop_top_input.setText(str(self.max_crop_per_side))
-                
-            if self.crop_bottom_value > self.max_crop_per_side:
-                self.crop_bottom_value = self.max_crop_per_side
-                self.crop_bottom_slider.setValue(self.max_crop_per_side)
-                self.crop_bottom_input.setText(str(self.max_crop_per_side))
-                
-            # Обновляем статус
-            self.status.setText(f'Видео загружено: {width}x{height} пикселей')
+        if self.crop_bottom_value > self.max_crop_per_side:
+            self.crop_bottom_value = self.max_crop_per_side
+            self.crop_bottom_slider.setValue(self.max_crop_per_side)
+            self.crop_bottom_input.setText(str(self.max_crop_per_side))
             
-        except Exception as e:
-            self.show_error(f"Не удалось определить размеры видео: {str(e)}")
-            # Установим значения по умолчанию
-            self.video_width = 1920
-            self.video_height = 1080
-            self.max_crop_per_side = 500
+        # Обновляем статус
+        self.status.setText(f'Видео загружено: {width}x{height} пикселей')
             
     def _on_crop_bottom_slider_changed(self, value):
         """Обработчик изменения значения нижней границы рамки через слайдер."""
@@ -992,182 +1118,207 @@ class VideoEditScreen(QWidget):
             self.crop_bottom_input.blockSignals(False)
             self._schedule_preview_update()
 
-    def get_effects_vf(self):
-        """Возвращает строку фильтра для ffmpeg с учетом выбранных эффектов."""
-        filters = []
-        simple_filters = []
-        if self.flip_enabled:
-            simple_filters.append("hflip")
-        if self.brightness_enabled and self.brightness_value > 0:
-            brightness_normalized = -self.brightness_value / 400.0
-            simple_filters.append(f"eq=brightness={brightness_normalized:.2f}")
-        filter_prefix = ""
-        if simple_filters:
-            filter_prefix = ",".join(simple_filters) + ","
-        if self.frame_enabled:
-            bg_darkness = -self.background_darkness_value / 100.0 * 0.7 if self.background_darkness_value > 0 else 0
-            blur_radius = self.background_blur_value if self.background_blur_value > 0 else 1
-            bg_scale = self.background_scale_value / 100.0
-            top_crop = self.crop_top_value
-            bottom_crop = self.crop_bottom_value
-            video_w = getattr(self, 'video_width', None)
-            video_h = getattr(self, 'video_height', None)
-            if not video_w or not video_h:
-                return None
-            # watermark + фон
-            if self.watermark_video_path and os.path.exists(self.watermark_video_path) and self.background_video_path and os.path.exists(self.background_video_path):
-                filter_complex = (
-                    f"{filter_prefix}"
-                    f"[1:v]scale={video_w}:ih*{bg_scale:.2f},boxblur=luma_radius={blur_radius}:luma_power=2,eq=brightness={bg_darkness:.2f},crop={video_w}:{video_h}:0:0[bg];"
-                    f"[2:v]format=rgba,colorchannelmixer=aa=0.5,scale={video_w}:{video_h}[wm];"
-                    f"[bg][wm]overlay=(W-w)/2:(H-h)/2[bgwm];"
-                    f"[0:v]crop=iw:ih-{top_crop}-{bottom_crop}:0:{top_crop}[fg];"
-                    f"[bgwm][fg]overlay=0:{top_crop}"
-                )
-                return filter_complex
-            # только watermark
-            elif self.watermark_video_path and os.path.exists(self.watermark_video_path):
-                total_crop_height = top_crop + bottom_crop
-                new_height = f"ih-{total_crop_height}"
-                crop_y_position = top_crop
-                vertical_offset = (bottom_crop - top_crop) // 2
-                filter_complex = (
-                    f"{filter_prefix}"
-                    f"[0:v]split[main][bg];"
-                    f"[bg]scale=iw*{bg_scale:.2f}:ih*{bg_scale:.2f},boxblur=luma_radius={blur_radius}:luma_power=2,eq=brightness={bg_darkness:.2f}[bg_blurred];"
-                    f"[1:v]format=rgba,colorchannelmixer=aa=0.5,scale={video_w}:{video_h}[wm];"
-                    f"[bg_blurred][wm]overlay=(W-w)/2:(H-h)/2[bgwm];"
-                    f"[main]crop=iw:{new_height}:0:{crop_y_position}[fg];"
-                    f"[bgwm][fg]overlay=(W-w)/2:(H-h)/2-{vertical_offset}[combined];"
-                    f"[combined]crop=iw/({bg_scale:.2f}):ih/({bg_scale:.2f}):iw/2-iw/(2*{bg_scale:.2f}):ih/2-ih/(2*{bg_scale:.2f})"
-                )
-                return filter_complex
-            # только фон
-            elif self.background_video_path and os.path.exists(self.background_video_path):
-                filter_complex = (
-                    f"{filter_prefix}"
-                    f"[1:v]scale={video_w}:ih*{bg_scale:.2f},boxblur=luma_radius={blur_radius}:luma_power=2,eq=brightness={bg_darkness:.2f},crop={video_w}:{video_h}:0:0[bg];"
-                    f"[0:v]crop=iw:ih-{top_crop}-{bottom_crop}:0:{top_crop}[fg];"
-                    f"[bg][fg]overlay=0:{top_crop}"
-                )
-                return filter_complex
-            # ни фон, ни watermark
-            else:
-                total_crop_height = top_crop + bottom_crop
-                new_height = f"ih-{total_crop_height}"
-                crop_y_position = top_crop
-                vertical_offset = (bottom_crop - top_crop) // 2
-                filter_complex = (
-                    f"{filter_prefix}split[main][bg];"
-                    f"[bg]scale=iw*{bg_scale:.2f}:ih*{bg_scale:.2f},boxblur=luma_radius={blur_radius}:luma_power=2,eq=brightness={bg_darkness:.2f}[bg_blurred];"
-                    f"[main]crop=iw:{new_height}:0:{crop_y_position}[fg];"
-                    f"[bg_blurred][fg]overlay=(W-w)/2:(H-h)/2-{vertical_offset}[combined];"
-                    f"[combined]crop=iw/({bg_scale:.2f}):ih/({bg_scale:.2f}):iw/2-iw/(2*{bg_scale:.2f}):ih/2-ih/(2*{bg_scale:.2f})"
-                )
-                return filter_complex
-        if simple_filters:
-            return ",".join(simple_filters)
-        return None
+    def get_effects_settings(self):
+        """Возвращает текущие настройки эффектов в формате vidify.core.effects."""
+        return {
+            'flip': self.flip_enabled,
+            'brightness': self.brightness_value if self.brightness_enabled else 0,
+            'frame': self.frame_enabled,
+            'crop_top': self.crop_top_value,
+            'crop_bottom': self.crop_bottom_value,
+            'background_blur': self.background_blur_value,
+            'background_darkness': self.background_darkness_value,
+            'background_scale': self.background_scale_value,
+            'background_video': self.background_video_path,
+            'watermark_video': self.watermark_video_path,
+        }
+
+    def get_effect_spec(self):
+        """Возвращает текущие настройки эффектов в виде неизменяемого EffectSpec."""
+        return EffectSpec.from_dict(self.get_effects_settings())
 
     def show_preview_frame(self):
         """Генерирует превью текущих настроек"""
-        if not self.input_path:
+        # Пока размеры видео не получены, превью строить не из чего
+        if not self.input_path or self.preview_engine is None:
+            return
+        # Одновременно строится только одно превью; запрос во время построения откладывается
+        # и после завершения выполняется один раз с самыми свежими настройками
+        if self._preview_in_flight:
+            self._preview_pending = True
+            return
+        # Превью строится по прокси-копии, если она есть; параметры в пикселях пересчитываются под ее размер
+        engine = self.preview_engine
+        spec = scale_spec(self.get_effect_spec(), engine.video_h / self.video_height)
+        graph = build_filter_graph(spec, engine.video_w, engine.video_h)
+        # Уже построенные превью берем из кэша
+        cache_key = make_preview_key(engine.input_path, self.frame_time, graph.filter, graph.inputs)
+        cached = self.preview_cache.get(cache_key)
+        if cached is not None:
+            self._preview_worker = None
+            self._display_preview_image(cached)
+            return
+        # Превью с диска декодируется в фоновом потоке
+        if self.preview_cache.on_disk(cache_key):
+            self._preview_worker = None
+            self._preview_in_flight = True
+            self.task_runner.submit(
+                self.preview_cache.load, cache_key,
+                on_result=self._on_disk_preview_loaded,
+                on_error=self._on_preview_error,
+            )
+            return
+        # Эффекты без внешних видео накладываются на кадр в памяти без запуска ffmpeg
+        if self.preview_engine.can_render(spec):
+            self._preview_worker = None
+            self._show_engine_preview(spec, cache_key)
             return
-        if self._preview_worker and self._preview_worker.isRunning():
-            self._preview_worker.stop()
         self.is_preview_generating = True
+        self._preview_in_flight = True
         self.status.setText('Генерация превью...')
-        filter_str = self.get_effects_vf()
-        preview_path = os.path.join(self.temp_dir, 'preview.png')
-        # watermark + фон
-        if self.frame_enabled and self.watermark_video_path and os.path.exists(self.watermark_video_path) and self.background_video_path and os.path.exists(self.background_video_path):
-            cmd = ['ffmpeg', '-y', '-ss', self.frame_time, '-i', self.input_path,
-                   '-ss', self.frame_time, '-i', self.background_video_path,
-                   '-ss', self.frame_time, '-i', self.watermark_video_path,
-                   '-filter_complex', filter_str, '-frames:v', '1', '-update', '1', preview_path]
-        # только watermark
-        elif self.frame_enabled and self.watermark_video_path and os.path.exists(self.watermark_video_path):
-            cmd = ['ffmpeg', '-y', '-ss', self.frame_time, '-i', self.input_path,
-                   '-ss', self.frame_time, '-i', self.watermark_video_path,
-                   '-filter_complex', filter_str, '-frames:v', '1', '-update', '1', preview_path]
-        # только фон
-        elif self.frame_enabled and self.background_video_path and os.path.exists(self.background_video_path):
-            cmd = ['ffmpeg', '-y', '-ss', self.frame_time, '-i', self.input_path, 
-                   '-ss', self.frame_time, '-i', self.background_video_path,
-                   '-filter_complex', filter_str, '-frames:v', '1', '-update', '1', preview_path]
-        else:
-            cmd = create_ffmpeg_command(self.input_path, preview_path, filter_str, is_preview=True, frame_time=self.frame_time)
-        self._preview_worker = FFmpegProcessor(cmd, output_path=preview_path)
-        self._preview_worker.finished.connect(lambda _: self._on_preview_ready(preview_path))
-        self._preview_worker.error.connect(self._on_preview_error)
+        # Кадр передается из ffmpeg через stdout без промежуточного файла
+        cmd = build_effects_command(engine.input_path, 'pipe:1', spec, engine.video_w, engine.video_h,
+                                    is_preview=True, frame_time=self.frame_time,
+                                    extra_args=rgb24_output_args(engine.video_w, engine.video_h))
+        worker = PreviewRenderer(cmd, engine.video_w, engine.video_h)
+        # Результаты устаревших запусков игнорируем
+        worker.finished.connect(lambda image: self._on_preview_ready(image, cache_key) if worker is self._preview_worker else None)
+        worker.error.connect(lambda error: self._on_preview_error(error) if worker is self._preview_worker else None)
+        self._preview_worker = worker
         self._preview_worker.start()
 
-    def _on_preview_ready(self, preview_path):
-        """Вызывается, когда превью готово"""
+    def _on_disk_preview_loaded(self, image):
+        """Показывает превью, прочитанное с диска"""
+        if image is None:
+            # Файл пропал с диска: строим превью заново (ключ уже забыт кэшем)
+            self._preview_in_flight = False
+            self._preview_pending = False
+            self.show_preview_frame()
+            return
+        self._display_preview_image(image)
+        self._finish_preview_render()
+
+    def _show_engine_preview(self, effects, cache_key):
+        """Строит превью из декодированного кадра в памяти"""
+        frame = self.preview_engine.cached_frame(self.frame_time)
+        if frame is None:
+            self._load_engine_frame(self.frame_time)
+            return
+        image = self.preview_engine.render(frame, effects)
+        self.preview_cache.put(cache_key, image)
+        self._display_preview_image(image)
+
+    def _display_preview_image(self, image):
+        """Показывает готовое превью"""
         self.is_preview_generating = False
         self.status.setText(f'Превью обновлено (кадр: {self.frame_time})')
-        self.set_preview(preview_path)
+        self.preview_label.setImage(image)
+
+    def _load_engine_frame(self, frame_time):
+        """Запускает декодирование кадра в фоновом потоке"""
+        self.is_preview_generating = True
+        self._preview_in_flight = True
+        self.status.setText('Генерация превью...')
+        loader = PreviewFrameLoader(self.preview_engine, frame_time)
+        # Результаты устаревших загрузчиков игнорируем
+        loader.frame_ready.connect(lambda time, frame: self._on_engine_frame_ready(loader, time, frame))
+        loader.error.connect(lambda error: self._on_preview_error(error) if loader is self._frame_loader else None)
+        self._frame_loader = loader
+        loader.start()
+
+    def _on_engine_frame_ready(self, loader, frame_time, frame):
+        """Вызывается, когда кадр декодирован"""
+        if loader is not self._frame_loader:
+            return
+        if loader.engine is self.preview_engine:
+            loader.engine.store_frame(frame_time, frame)
+        # Пока кадр декодировался, могли измениться настройки, кадр или видео превью —
+        # превью строится по текущему состоянию
+        self._preview_in_flight = False
+        self._preview_pending = False
+        self.show_preview_frame()
+
+    def _on_preview_ready(self, image, cache_key=None):
+        """Вызывается, когда превью готово"""
+        if cache_key:
+            self.preview_cache.put(cache_key, image)
+            # На диск сохраняются только превью из ffmpeg (превью из кадра в памяти
+            # строятся быстрее, чем читается PNG); PNG кодируется в фоновом потоке
+            self.task_runner.submit(self.preview_cache.save, cache_key, image)
+        self._display_preview_image(image)
+        self._finish_preview_render()
         
     def _on_preview_error(self, error):
         """Вызывается при ошибке генерации превью"""
         self.is_preview_generating = False
         self.show_error(error)
+        self._finish_preview_render()
 
-    def set_preview(self, preview_path):
-        """Устанавливает превью в интерфейсе"""
-        if not os.path.exists(preview_path):
-            self.show_error('Файл превью не найден')
-            return
-            
-        # Очищаем предыдущее изображение, если оно было
-        if self.preview_label._pixmap:
-            self.preview_label._pixmap = None
-            
-        pix = QPixmap(preview_path)
-        if pix.isNull():
-            self.show_error('Не удалось загрузить превью')
-            return
-            
-        self.preview_label.setPixmap(pix)
+    def _finish_preview_render(self):
+        """Завершает построение превью и выполняет отложенный запрос, если он есть"""
+        self._preview_in_flight = False
+        if self._preview_pending:
+            self._preview_pending = False
+            self.show_preview_frame()
+
+    def _reset_preview_render(self):
+        """Забывает о превью прежнего видео: его результаты будут проигнорированы"""
+        self._debounce_timer.stop()
+        # Процессы ffmpeg прежнего видео завершаются сразу
+        for worker in (self._preview_worker, self._frame_loader):
+            if worker:
+                worker.stop()
+        self._preview_worker = None
+        self._frame_loader = None
+        self._preview_in_flight = False
+        self._preview_pending = False
 
     def process_unique_video(self):
         """Обрабатывает видео с выбранными эффектами"""
         if not self.input_path:
             return
-        filter_str = self.get_effects_vf()
-        if not filter_str:
+        spec = self.get_effect_spec()
+        if not build_filter_graph(spec, self.video_width, self.video_height).filter:
             self.show_error('Пожалуйста, выберите хотя бы один эффект для уникализации')
             return
         base_name = os.path.basename(self.input_path)
         name, ext = os.path.splitext(base_name)
         output_path = os.path.join(self.output_dir, f"{name}_unique{ext}")
-        # watermark + фон
-        if self.frame_enabled and self.watermark_video_path and os.path.exists(self.watermark_video_path) and self.background_video_path and os.path.exists(self.background_video_path):
-            cmd = ['ffmpeg', '-y', '-i', self.input_path, '-i', self.background_video_path, '-i', self.watermark_video_path,
-                   '-filter_complex', filter_str, '-c:a', 'copy', output_path]
-        # только watermark
-        elif self.frame_enabled and self.watermark_video_path and os.path.exists(self.watermark_video_path):
-            cmd = ['ffmpeg', '-y', '-i', self.input_path, '-i', self.watermark_video_path,
-                   '-filter_complex', filter_str, '-c:a', 'copy', output_path]
-        # только фон
-        elif self.frame_enabled and self.background_video_path and os.path.exists(self.background_video_path):
-            cmd = ['ffmpeg', '-y', '-i', self.input_path, '-i', self.background_video_path,
-                   '-filter_complex', filter_str, '-c:a', 'copy', output_path]
-        else:
-            cmd = create_ffmpeg_command(self.input_path, output_path, filter_str)
-        self.run_ffmpeg_with_progress(cmd, output_path)
+        # Длинные видео на многоядерных машинах обрабатываем по частям параллельно.
+        # Длительность берется из уже полученной информации: ffprobe в потоке интерфейса не запускается
+        # (пока она неизвестна, видео обрабатывается одним процессом)
+        if should_encode_segmented(self.input_path, self.video_duration):
+            self._start_video_worker(SegmentedFFmpegProcessor(
+                self.input_path, output_path, spec,
+                self.video_width, self.video_height, temp_dir=self.temp_dir,
+                intermediates=self.intermediates
+            ))
+            return
+        if not spec.inputs:
+            cmd = build_effects_command(self.input_path, output_path, spec, self.video_width, self.video_height)
+            self.run_ffmpeg_with_progress(cmd, output_path)
+            return
+        # Фон и watermark обрабатываются заранее (или берутся из кэша), основная обработка только накладывает их
+        self._start_video_worker(PrerenderedFFmpegProcessor(
+            self.input_path, output_path, spec, self.video_width, self.video_height, self.intermediates
+        ))
 
     def run_ffmpeg_with_progress(self, cmd, output_path):
         """Запускает FFmpeg с отображением прогресса"""
+        self._start_video_worker(FFmpegProcessor(cmd, output_path, parse_progress=True))
+
+    def _start_video_worker(self, worker):
+        """Запускает поток обработки видео с отображением прогресса"""
         self.status.setText('Обработка видео...')
         self.progress.setVisible(True)
         self.progress.setValue(0)
         self.unique_btn.setEnabled(False)
         self.cancel_btn.setVisible(True)
         
-        # Запускаем FFmpeg в отдельном потоке
-        self._ffmpeg_video_worker = FFmpegProcessor(cmd, output_path, parse_progress=True)
+        # Запускаем обработку в отдельном потоке
+        self._ffmpeg_video_worker = worker
         self._ffmpeg_video_worker.progress.connect(self._on_ffmpeg_progress)
+        self._ffmpeg_video_worker.progress_info.connect(self._on_ffmpeg_progress_info)
         self._ffmpeg_video_worker.finished.connect(self._on_video_ready)
         self._ffmpeg_video_worker.error.connect(self._on_video_error)
         self._ffmpeg_video_worker.start()
@@ -1176,6 +1327,10 @@ class VideoEditScreen(QWidget):
         """Обновляет прогресс-бар"""
         self.progress.setValue(percent)
 
+    def _on_ffmpeg_progress_info(self, info):
+        """Показывает скорость обработки и оставшееся время"""
+        self.status.setText(f'Обработка видео... {info.describe()}')
+
     def _on_video_ready(self, path):
         """Видео обработано успешно"""
         self.status.setText(f'Готово: {os.path.basename(path)}')
@@ -1197,7 +1352,7 @@ class VideoEditScreen(QWidget):
 
     def resizeEvent(self, event):
         """Обработчик изменения размера виджета"""
-        # Просто обновляем превью, если оно загружено
+        # Готовое превью только масштабируется заново, ffmpeg не запускается
         if self.preview_label._pixmap:
             self.preview_label.update()
         super().resizeEvent(event)
@@ -1384,11 +1539,13 @@ class VideoEditScreen(QWidget):
         if not self.input_path or not os.path.exists(self.input_path):
             return
             
-        # Изменяем время кадра, используем простую схему переключения между 5 точками видео
-        time_points = ["00:00:00.2", "00:00:02.0", "00:00:05.0", "00:00:10.0", "00:00:30.0"]
-        current_index = time_points.index(self.frame_time) if self.frame_time in time_points else 0
-        next_index = (current_index + 1) % len(time_points)
-        self.frame_time = time_points[next_index]
-        
-        # Обновляем превью с новым кадром
-        self.show_preview_frame()
\ No newline at end of file
+        # Переходим к следующей миниатюре шкалы времени (пока ее нет — к следующей из стандартных точек)
+        if self.filmstrip:
+            time_points = list(self.filmstrip.times)
+        else:
+            time_points = [parse_timestamp(point) for point in DEFAULT_TIME_POINTS]
+        # Сравниваем с выбранным временем, а не с привязанным к ключевому кадру:
+        # иначе при редких ключевых кадрах кнопка возвращала бы к той же миниатюре
+        current = self.requested_frame_time
+        later = [point for point in time_points if point > current + 0.001]
+        self._select_frame_time(later[0] if later else time_points[0])
\ No newline at end of file